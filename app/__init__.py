@@ -1,16 +1,20 @@
 from flask import Flask, session
 from config import Config
-from .extensions import db, login_manager, migrate, scheduler
+from .extensions import db, login_manager, migrate, scheduler, cache, query_stats, profiler, metrics, slow_queries
 import os
-from decimal import Decimal
+from .filters import format_currency
 
 from .auth import models as auth_models
 from .financeiro import models as financeiro_models
+from .financeiro import ledger as financeiro_ledger
+from .financeiro.search import include_object as search_include_object
+from .scheduling import leader_task, start_scheduler
 
 from .auth.routes import auth_bp
 from .main.routes import main_bp
 from .financeiro.routes import financeiro_bp
 from .admin.routes import admin_bp
+from .financeiro.commands import reconcile_balances_command, rebuild_rollups_command, seed_command
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -18,20 +22,18 @@ def create_app(config_class=Config):
 
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+    # Antes do db.init_app: define a classe do pool que mede a espera no checkout
+    metrics.init_app(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=search_include_object)
     login_manager.init_app(app)
     scheduler.init_app(app)
+    cache.init_app(app)
+    query_stats.init_app(app)
+    profiler.init_app(app)
+    slow_queries.init_app(app)
 
-    @app.template_filter('currency')
-    def format_currency(value):
-        if value is None:
-            return 'R$ 0,00'
-        
-        if not isinstance(value, Decimal):
-            value = Decimal(str(value))
-        
-        return f"R$ {value:,.2f}".replace(",", "V").replace(".", ",").replace("V", ".")
+    app.add_template_filter(format_currency, 'currency')
 
     from flask import get_flashed_messages
     @app.context_processor
@@ -60,17 +62,30 @@ def create_app(config_class=Config):
                 
                 return redirect(url_for(request.endpoint, **request.args))
     
-    @scheduler.task('interval', id='recorrencia_check', minutes=30)
+    @leader_task(app, 'interval', id='recorrencia_check', minutes=30)
     def job_process_recorrencia():
-        with app.app_context():
-            from .financeiro.tasks import process_recurrent_transactions
-            process_recurrent_transactions()
+        from .financeiro.tasks import process_recurrent_transactions
+        return process_recurrent_transactions()
+
+    @leader_task(app, 'cron', id='notificacoes_do_dia', hour=0, minute=5)
+    def job_refresh_notifications():
+        from .financeiro.tasks import refresh_due_today_counts
+        refresh_due_today_counts()
     
-    scheduler.start()
+    start_scheduler(app)
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(financeiro_bp)
     app.register_blueprint(admin_bp)
 
+    app.cli.add_command(reconcile_balances_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(seed_command)
+
+    # Comandos de desenvolvimento (pacote tools, fora do caminho de import dos workers)
+    if app.config.get('DEV_COMMANDS'):
+        from tools import register_commands
+        register_commands(app)
+
     return app
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, abort, jsonify, send_from_directory
 from flask_login import login_required, current_user
-from app.extensions import db
+from app.extensions import db, cache, profiler, slow_queries
+from app.scheduling import scheduler_status
 from app.auth.models import User
 from sqlalchemy import update
 from config import Config
@@ -132,3 +133,48 @@ def reset_user_password(user_id):
         flash('Erro na redefinição de senha. Verifique se as senhas coincidem e atendem ao requisito de tamanho.', 'danger')
         
     return redirect(url_for('admin.list_users'))
+
+@admin_bp.route('/cache')
+@admin_required
+def cache_stats():
+    """Contadores de acerto/falha do cache de payloads (dashboard)."""
+    return jsonify(cache.stats())
+
+@admin_bp.route('/scheduler')
+@admin_required
+def scheduler_stats():
+    """Líder atual do agendador e duração/atraso da última execução de cada job."""
+    return jsonify(scheduler_status())
+
+@admin_bp.route('/profiles')
+@admin_required
+def list_profiles():
+    """Perfis gravados com ?_profile=1, com os links de download."""
+    return jsonify([
+        {
+            'id': profile_id,
+            'prof': url_for('admin.download_profile', filename=f'{profile_id}.prof'),
+            'collapsed': url_for('admin.download_profile', filename=f'{profile_id}.collapsed'),
+        }
+        for profile_id in profiler.list_ids()
+    ])
+
+@admin_bp.route('/profiles/<path:filename>')
+@admin_required
+def download_profile(filename):
+    if not filename.endswith(('.prof', '.collapsed')) or not profiler.directory:
+        abort(404)
+    return send_from_directory(profiler.directory, filename, as_attachment=True)
+
+@admin_bp.route('/slow-queries')
+@admin_required
+def slow_queries_report():
+    """Statements mais lentos (log de consultas lentas) agregados por fingerprint, para priorizar índices."""
+    sort = request.args.get('sort', 'total')
+    return render_template(
+        'admin/slow_queries.html',
+        offenders=slow_queries.top_offenders(sort=sort),
+        sort=sort,
+        enabled=slow_queries.threshold is not None,
+        threshold_ms=current_app.config.get('SLOW_QUERY_THRESHOLD_MS', 100),
+    )
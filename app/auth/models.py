@@ -16,6 +16,14 @@ class User(UserMixin, db.Model):
     access_due_date = db.Column(db.Date, nullable=True) 
     pending_message = db.Column(db.String(500), nullable=True)
 
+    # Incrementado a cada escrita financeira (app.financeiro.ledger); compõe as chaves de cache
+    data_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    # Contagem de itens pendentes vencendo em notif_day (job diário + ajustes incrementais do ledger)
+    notif_day = db.Column(db.Date, nullable=True)
+    notif_revenue_today = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    notif_expense_today = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
     wallets = db.relationship('Wallet', backref='user', lazy='dynamic')
     categories = db.relationship('RevenueCategory', backref='user', lazy='dynamic')
     transactions = db.relationship('RevenueTransaction', backref='user', lazy='dynamic')
@@ -3,8 +3,9 @@ from flask_login import login_user, logout_user, current_user, login_required
 from app.extensions import db
 from app.auth.models import User
 from .forms import LoginForm, RegistrationForm, ChangePasswordForm, ChangeEmailForm, ResetDataForm
-from app.financeiro.models import Wallet, RevenueCategory, ExpenseCategory, RevenueTransaction, Expense, Transfer
+from app.financeiro.models import Wallet, RevenueCategory, ExpenseCategory, RevenueTransaction, Expense, Transfer, MonthlyRollup
 from .models import User
+from app.financeiro.ledger import bump_data_version
 from config import Config
 from datetime import date, timedelta
 
@@ -53,6 +54,14 @@ def reset_account_data():
             RevenueTransaction.query.filter_by(user_id=current_user.id).delete()
             Expense.query.filter_by(user_id=current_user.id).delete()
             Transfer.query.filter_by(user_id=current_user.id).delete()
+
+            # DELETE em massa não passa pelos eventos do ORM: sem lançamentos, o saldo volta ao inicial
+            Wallet.query.filter_by(user_id=current_user.id).update({Wallet.balance: Wallet.initial_balance})
+            MonthlyRollup.query.filter_by(user_id=current_user.id).delete()
+            # Sem lançamentos, nada vence hoje: zera as contagens pré-calculadas da barra lateral
+            User.query.filter_by(id=current_user.id).update(
+                {User.notif_day: date.today(), User.notif_revenue_today: 0, User.notif_expense_today: 0})
+            bump_data_version(db.session, [current_user.id])
             
             msg = 'Todos os lançamentos foram apagados com sucesso.'
             
@@ -0,0 +1,179 @@
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from importlib import import_module
+
+
+class LRUBackend:
+    """Cache em memória do processo, limitado a max_entries (descarta o menos usado)."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FileSystemBackend:
+    """Cache compartilhado entre processos (workers) através de um diretório local."""
+
+    def __init__(self, directory, timeout=86400, prune_every=100):
+        self.directory = directory
+        self.timeout = timeout
+        self.prune_every = prune_every
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.cache')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.timeout:
+                return None
+            with open(path, 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        return value if stored_key == key else None
+
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove as entradas expiradas do diretório."""
+        limit = time.time() - self.timeout
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def _load_backend(app):
+    backend = app.config.get('CACHE_BACKEND', 'memory')
+
+    if backend in (None, '', 'memory', 'none'):
+        return None
+    if backend == 'filesystem':
+        directory = app.config.get('CACHE_DIR') or os.path.join(app.instance_path, 'cache')
+        return FileSystemBackend(directory, timeout=app.config.get('CACHE_DEFAULT_TIMEOUT', 86400))
+
+    # Caminho 'pacote.modulo:Classe' para um backend próprio (ex.: Redis/Memcached)
+    module_name, _, class_name = backend.partition(':')
+    backend_class = getattr(import_module(module_name), class_name)
+    return backend_class(app)
+
+
+class VersionedCache:
+    """Cache de payloads com LRU local e, opcionalmente, um backend compartilhado.
+
+    As chaves devem incluir a versão dos dados do usuário (User.data_version), de modo
+    que qualquer escrita financeira torna as entradas antigas inalcançáveis sem
+    precisar invalidá-las explicitamente.
+    """
+
+    def __init__(self, app=None):
+        self.local = LRUBackend()
+        self.shared = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.local = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 512))
+        self.shared = _load_backend(app)
+        app.extensions['versioned_cache'] = self
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        self._count(value is not None)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def get_or_set(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'local_entries': len(self.local),
+            'local_max_entries': self.local.max_entries,
+            'shared_backend': type(self.shared).__name__ if self.shared is not None else None,
+        }
@@ -2,11 +2,21 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_apscheduler import APScheduler
+from .cache import VersionedCache
+from .query_stats import QueryStats
+from .profiling import RequestProfiler
+from .metrics import Metrics
+from .slow_queries import SlowQueryLog
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 migrate = Migrate()
 scheduler = APScheduler()
+cache = VersionedCache()
+query_stats = QueryStats()
+profiler = RequestProfiler()
+metrics = Metrics()
+slow_queries = SlowQueryLog()
 
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Por favor, faça login para acessar.'
@@ -0,0 +1,10 @@
+from decimal import Decimal
+
+def format_currency(value):
+    if value is None:
+        return 'R$ 0,00'
+    
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    
+    return f"R$ {value:,.2f}".replace(",", "V").replace(".", ",").replace("V", ".")
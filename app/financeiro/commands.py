@@ -0,0 +1,83 @@
+import time
+from datetime import date
+
+import click
+from flask.cli import with_appcontext
+from .ledger import reconcile_balances, rebuild_rollups
+
+
+@click.command('reconcile-balances')
+@click.option('--dry-run', is_flag=True, help='Apenas relata as divergências, sem corrigir os saldos.')
+@with_appcontext
+def reconcile_balances_command(dry_run):
+    """Recalcula o saldo materializado das carteiras e relata divergências."""
+    drifts = reconcile_balances(fix=not dry_run)
+
+    if not drifts:
+        click.echo('Nenhuma divergência encontrada: todos os saldos conferem.')
+        return
+
+    for wallet_id, name, stored, expected in drifts:
+        click.echo(f'Carteira {wallet_id} ({name}): gravado {stored:.2f}, esperado {expected:.2f}, diferença {expected - stored:+.2f}')
+
+    if dry_run:
+        click.echo(f'{len(drifts)} carteira(s) com divergência (nada foi alterado).')
+    else:
+        click.echo(f'{len(drifts)} carteira(s) corrigida(s).')
+
+
+@click.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Reconstrói apenas os rollups deste usuário.')
+@with_appcontext
+def rebuild_rollups_command(user_id):
+    """Recria a tabela monthly_rollup a partir das receitas e despesas (backfill)."""
+    written = rebuild_rollups(user_id=user_id)
+    alvo = f'do usuário {user_id}' if user_id is not None else 'de todos os usuários'
+    click.echo(f'Rollups {alvo} reconstruídos: {written} linha(s) gravada(s).')
+
+
+@click.command('seed')
+@click.option('--users', default=10, show_default=True, help='Quantidade de usuários gerados.')
+@click.option('--wallets', default=3, show_default=True, help='Carteiras por usuário.')
+@click.option('--revenue-categories', default=6, show_default=True, help='Categorias de receita por usuário.')
+@click.option('--expense-categories', default=10, show_default=True, help='Categorias de despesa por usuário.')
+@click.option('--revenues', default=600, show_default=True, help='Receitas por usuário.')
+@click.option('--expenses', default=2400, show_default=True, help='Despesas por usuário.')
+@click.option('--recurrent', default=5, show_default=True, help='Lançamentos recorrentes (templates) por usuário.')
+@click.option('--transfers', default=50, show_default=True, help='Transferências por usuário.')
+@click.option('--years', default=3, show_default=True, help='Anos de histórico até a data de referência.')
+@click.option('--seed', 'seed_value', default=42, show_default=True, help='Semente do gerador (mesma semente, mesmos dados).')
+@click.option('--anchor', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Data de referência (AAAA-MM-DD); padrão: hoje. Fixe-a para repetir exatamente os dados.')
+@click.option('--prefix', default='seed', show_default=True, help='Prefixo dos nomes de usuário e e-mails.')
+@click.option('--password', default='seed1234', show_default=True, help='Senha de todos os usuários gerados.')
+@with_appcontext
+def seed_command(users, wallets, revenue_categories, expense_categories, revenues, expenses, recurrent,
+                 transfers, years, seed_value, anchor, prefix, password):
+    """Gera usuários e lançamentos sintéticos em lote, de forma determinística, para testes de carga."""
+    from .seed import SeedOptions, seed
+
+    options = SeedOptions(
+        users=users, wallets=max(wallets, 1), revenue_categories=max(revenue_categories, 1),
+        expense_categories=max(expense_categories, 1), revenues=revenues, expenses=expenses,
+        recurrent=recurrent, transfers=transfers, years=max(years, 1), seed=seed_value,
+        anchor=anchor.date() if anchor else date.today(), prefix=prefix, password=password,
+    )
+    started = time.perf_counter()
+    step = max(users // 10, 1)
+
+    def progress(done):
+        if done % step == 0 or done == users:
+            click.echo(f'  {done}/{users} usuário(s) gerado(s)')
+
+    try:
+        counts = seed(options, progress=progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for name, count in sorted(counts.items()):
+        click.echo(f'{name}: {count} linha(s)')
+    click.echo(f'{total} linha(s) em {elapsed:.1f}s ({total / elapsed:.0f} linhas/s), semente {seed_value}, '
+               f'referência {options.anchor:%Y-%m-%d}.')
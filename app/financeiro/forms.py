@@ -87,6 +87,7 @@ class RevenueTransactionForm(FlaskForm):
         Optional(), 
         NumberRange(min=0, max=360, message="Máximo de 360 repetições.")
     ])
+    split_amount = BooleanField('Valor informado é o total (dividir entre as parcelas)')
 
     frequency = SelectField('Frequência de Recorrência', choices=[
         ('', 'Não Recorrente'),
@@ -158,6 +159,7 @@ class ExpenseForm(FlaskForm):
         Optional(), 
         NumberRange(min=0, max=360, message="Máximo de 360 repetições.")
     ])
+    split_amount = BooleanField('Valor informado é o total (dividir entre as parcelas)')
     
     frequency = SelectField('Frequência de Recorrência', choices=[
         ('', 'Não Recorrente'),
@@ -0,0 +1,36 @@
+from app.extensions import db
+from .ledger import SETTLEMENT, bulk_insert
+from .recurrence import installment_dates
+from decimal import Decimal, ROUND_DOWN
+
+CENT = Decimal('0.01')
+
+
+def split_amount(total, parts):
+    """Divide total em parts parcelas com centavos exatos; a sobra do arredondamento vai na primeira."""
+    total = Decimal(total).quantize(CENT)
+    base = (total / parts).quantize(CENT, rounding=ROUND_DOWN)
+    remainder = total - base * parts
+    return [base + remainder] + [base] * (parts - 1)
+
+
+def create_installments(model, first_due, frequency, count, amount, split=False,
+                        settle_first=False, settled_at=None, **values):
+    """Grava count lançamentos, com vencimentos a partir de first_due, em um único insert().
+
+    Com split=True, amount é o valor total e é dividido entre as parcelas. As parcelas ficam
+    pendentes, exceto a primeira quando settle_first=True (baixada em settled_at). Os demais
+    campos (description, date, user_id, wallet_id, category_id, ...) vêm em values. Retorna a
+    quantidade de lançamentos gravados, sem carregá-los de volta.
+    """
+    settled_attr, settled_at_attr, _, _ = SETTLEMENT[model]
+    amounts = split_amount(amount, count) if split else [Decimal(amount)] * count
+
+    rows = [
+        dict(values, amount=value, due_date=due_date, is_recurrent=False, frequency=None,
+             last_launch_date=None, next_run_at=None, **{settled_attr: False, settled_at_attr: None})
+        for due_date, value in zip(installment_dates(first_due, frequency, count), amounts)
+    ]
+    if settle_first and rows:
+        rows[0].update({settled_attr: True, settled_at_attr: settled_at})
+    return bulk_insert(db.session, model, rows)
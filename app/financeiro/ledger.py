@@ -0,0 +1,475 @@
+from app.extensions import db
+from .models import Wallet, RevenueCategory, RevenueTransaction, ExpenseCategory, Expense, Transfer, MonthlyRollup
+from app.auth.models import User
+from sqlalchemy import event, update, insert, delete, extract, func, bindparam, case, and_
+from sqlalchemy.orm import attributes
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+# Modelo -> (atributo de baixa, data da baixa, sinal do efeito no saldo da carteira, tipo no rollup)
+SETTLEMENT = {
+    RevenueTransaction: ('is_received', 'receipt_date', 1, 'revenue'),
+    Expense: ('is_paid', 'payment_date', -1, 'expense'),
+}
+
+# Modelos cuja escrita invalida os dados em cache do usuário (User.data_version)
+VERSIONED_MODELS = (Wallet, RevenueCategory, ExpenseCategory, RevenueTransaction, Expense, Transfer)
+
+TRACKED_ATTRIBUTES = ('amount', 'wallet_id', 'category_id', 'user_id', 'due_date',
+                      'is_received', 'receipt_date', 'is_paid', 'payment_date')
+
+
+def _previous_value(obj, key):
+    """Valor do atributo como está no banco (antes das alterações pendentes)."""
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _current_value(obj, key):
+    return getattr(obj, key)
+
+
+def _row_state(obj, previous=False):
+    """Extrai os campos de um lançamento que afetam saldos e rollups."""
+    get = _previous_value if previous else _current_value
+    settled_attr, settled_at_attr, sign, kind = SETTLEMENT[type(obj)]
+
+    wallet = get(obj, 'wallet_id')
+    if wallet is None and not previous and obj.wallet is not None:
+        # Carteira ainda sem id (criada no mesmo flush): resolvida após o INSERT
+        wallet = obj.wallet
+
+    return {
+        'kind': kind,
+        'sign': sign,
+        'user_id': get(obj, 'user_id'),
+        'wallet': wallet,
+        'category_id': get(obj, 'category_id'),
+        'amount': get(obj, 'amount'),
+        'due_date': get(obj, 'due_date'),
+        'settled': bool(get(obj, settled_attr)),
+        'settled_at': get(obj, settled_at_attr),
+    }
+
+
+def first_of_month(value):
+    return date(value.year, value.month, 1)
+
+
+class LedgerDelta:
+    """Acumula as variações de saldo e de rollup geradas por um flush (ou por uma operação em massa)."""
+
+    def __init__(self):
+        self.wallets = defaultdict(Decimal)
+        self.rollups = defaultdict(lambda: [Decimal(0), 0])
+        self.users = set()
+        self.due_today = defaultdict(int)
+        self.today = date.today()
+
+    def add_row(self, state, factor):
+        if state['user_id'] is not None:
+            self.users.add(state['user_id'])
+        if state['amount'] is None:
+            return
+        amount = Decimal(state['amount']) * factor
+
+        if state['settled'] and state['wallet'] is not None:
+            self.wallets[state['wallet']] += amount * state['sign']
+
+        if state['due_date'] is not None:
+            self._add_rollup(state, 'projected', state['due_date'], amount, factor)
+            if state['due_date'] == self.today and not state['settled']:
+                self.due_today[(state['user_id'], state['kind'])] += factor
+        if state['settled'] and state['settled_at'] is not None:
+            self._add_rollup(state, 'realized', state['settled_at'], amount, factor)
+
+    def _add_rollup(self, state, basis, when, amount, factor):
+        key = (state['user_id'], first_of_month(when), state['wallet'], state['category_id'], state['kind'], basis)
+        entry = self.rollups[key]
+        entry[0] += amount
+        entry[1] += factor
+
+    def add_wallet(self, wallet, amount):
+        if amount:
+            self.wallets[wallet] += Decimal(amount)
+
+    def touch_user(self, user_id):
+        if user_id is not None:
+            self.users.add(user_id)
+
+    def add_group(self, kind, basis, user_id, month, wallet_id, category_id, total, count):
+        """Variação de rollup de um grupo de lançamentos (operações em massa por agregação)."""
+        entry = self.rollups[(user_id, month, wallet_id, category_id, kind, basis)]
+        entry[0] += Decimal(total)
+        entry[1] += count
+        self.touch_user(user_id)
+
+    def add_due_today(self, user_id, kind, count):
+        if count:
+            self.due_today[(user_id, kind)] += count
+
+    def apply(self, session):
+        """Grava as variações com UPDATEs incrementais na transação corrente."""
+        connection = session.connection()
+        wallet_table = Wallet.__table__
+
+        # Um executemany para todas as carteiras (e um lote para várias chaves de rollup, abaixo):
+        # uma ação em massa não vira uma UPDATE por carteira, que o detector de N+1 sinalizaria
+        balances = [{'b_wallet_id': _wallet_id(key), 'b_amount': amount} for key, amount in self.wallets.items() if amount]
+        if balances:
+            connection.execute(
+                update(wallet_table)
+                .where(wallet_table.c.id == bindparam('b_wallet_id'))
+                .values(balance=wallet_table.c.balance + bindparam('b_amount')),
+                balances
+            )
+        changed_ids = {balance['b_wallet_id'] for balance in balances}
+
+        if changed_ids:
+            for obj in list(session.identity_map.values()):
+                if isinstance(obj, Wallet) and obj.id in changed_ids:
+                    session.expire(obj, ['balance'])
+
+        rollups = [
+            ((user_id, month, _wallet_id(wallet), category_id, kind, basis), total, count)
+            for (user_id, month, wallet, category_id, kind, basis), (total, count) in self.rollups.items()
+            if total or count
+        ]
+        if len(rollups) > 1:
+            _apply_rollups_batch(connection, rollups)
+        elif rollups:
+            key, total, count = rollups[0]
+            _apply_rollup(connection, *key, total, count)
+
+        bump_data_version(session, self.users)
+        self._apply_due_today(session)
+
+    def _apply_due_today(self, session):
+        """Ajusta as contagens de notificação do dia sem recontar os lançamentos."""
+        user_table = User.__table__
+        columns = {'revenue': 'notif_revenue_today', 'expense': 'notif_expense_today'}
+        changed_ids = set()
+
+        for (user_id, kind), count in self.due_today.items():
+            if not count or user_id is None:
+                continue
+            column = user_table.c[columns[kind]]
+            session.connection().execute(
+                update(user_table)
+                .where(user_table.c.id == user_id, user_table.c.notif_day == self.today)
+                .values({column: column + count})
+            )
+            changed_ids.add(user_id)
+
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, User) and obj.id in changed_ids:
+                session.expire(obj, list(columns.values()))
+
+
+def bulk_insert(session, model, rows):
+    """Grava lançamentos com um único insert() em massa (executemany) e atualiza o ledger."""
+    if not rows:
+        return 0
+    session.execute(insert(model), rows)
+    record_bulk_insert(session, model, rows)
+    return len(rows)
+
+
+def record_bulk_insert(session, model, rows):
+    """Aplica ao ledger lançamentos gravados com insert() em massa, que não passam pelo flush."""
+    settled_attr, settled_at_attr, sign, kind = SETTLEMENT[model]
+    delta = LedgerDelta()
+    for row in rows:
+        delta.add_row({
+            'kind': kind,
+            'sign': sign,
+            'user_id': row['user_id'],
+            'wallet': row['wallet_id'],
+            'category_id': row['category_id'],
+            'amount': row['amount'],
+            'due_date': row['due_date'],
+            'settled': bool(row.get(settled_attr)),
+            'settled_at': row.get(settled_at_attr),
+        }, 1)
+    delta.apply(session)
+
+
+def settle_where(session, model, where, when):
+    """Baixa (paga/recebe) com um único UPDATE os lançamentos pendentes que atendem a where.
+
+    Os lançamentos que já tinham data de baixa a mantêm; os demais recebem when. Saldos,
+    rollups e notificações vêm de uma consulta agrupada, sem carregar as linhas.
+    Retorna a quantidade de lançamentos baixados.
+    """
+    settled_attr, settled_at_attr, sign, kind = SETTLEMENT[model]
+    settled, settled_at = getattr(model, settled_attr), getattr(model, settled_at_attr)
+    where = [*where, settled == False]
+    today = date.today()
+
+    year, month = extract('year', settled_at), extract('month', settled_at)
+    groups = session.execute(
+        db.select(model.user_id, model.wallet_id, model.category_id, year, month,
+                  func.sum(model.amount), func.count(model.id),
+                  func.sum(case((model.due_date == today, 1), else_=0)))
+        .where(*where)
+        .group_by(model.user_id, model.wallet_id, model.category_id, year, month)
+    ).all()
+
+    delta = LedgerDelta()
+    for user_id, wallet_id, category_id, settled_year, settled_month, total, count, due_today in groups:
+        realized_month = date(int(settled_year), int(settled_month), 1) if settled_year else first_of_month(when)
+        delta.add_wallet(wallet_id, Decimal(total) * sign)
+        delta.add_group(kind, 'realized', user_id, realized_month, wallet_id, category_id, total, count)
+        delta.add_due_today(user_id, kind, -due_today)
+
+    table = model.__table__
+    result = session.execute(
+        update(table).where(*where).values({settled_attr: True, settled_at_attr: func.coalesce(settled_at, when)})
+    )
+    delta.apply(session)
+    return result.rowcount
+
+
+def delete_where(session, model, where):
+    """Exclui com um único DELETE os lançamentos que atendem a where, desfazendo seus efeitos no ledger.
+
+    Retorna a quantidade de lançamentos excluídos.
+    """
+    settled_attr, settled_at_attr, sign, kind = SETTLEMENT[model]
+    settled, settled_at = getattr(model, settled_attr), getattr(model, settled_at_attr)
+    today = date.today()
+
+    due_year, due_month = extract('year', model.due_date), extract('month', model.due_date)
+    settled_year, settled_month = extract('year', settled_at), extract('month', settled_at)
+    groups = session.execute(
+        db.select(model.user_id, model.wallet_id, model.category_id, settled,
+                  due_year, due_month, settled_year, settled_month,
+                  func.sum(model.amount), func.count(model.id),
+                  func.sum(case((and_(model.due_date == today, settled == False), 1), else_=0)))
+        .where(*where)
+        .group_by(model.user_id, model.wallet_id, model.category_id, settled,
+                  due_year, due_month, settled_year, settled_month)
+    ).all()
+
+    delta = LedgerDelta()
+    for (user_id, wallet_id, category_id, is_settled, d_year, d_month, s_year, s_month,
+         total, count, due_today) in groups:
+        delta.add_group(kind, 'projected', user_id, date(int(d_year), int(d_month), 1),
+                        wallet_id, category_id, -Decimal(total), -count)
+        if is_settled:
+            delta.add_wallet(wallet_id, -Decimal(total) * sign)
+            if s_year:
+                delta.add_group(kind, 'realized', user_id, date(int(s_year), int(s_month), 1),
+                                wallet_id, category_id, -Decimal(total), -count)
+        delta.add_due_today(user_id, kind, -due_today)
+
+    result = session.execute(delete(model.__table__).where(*where))
+    delta.apply(session)
+    return result.rowcount
+
+
+def bump_data_version(session, user_ids):
+    """Incrementa User.data_version, invalidando os payloads em cache desses usuários."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    user_table = User.__table__
+    session.connection().execute(
+        update(user_table)
+        .where(user_table.c.id.in_(user_ids))
+        .values(data_version=user_table.c.data_version + 1)
+    )
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, User) and obj.id in user_ids:
+            session.expire(obj, ['data_version'])
+
+
+def _wallet_id(key):
+    return key.id if isinstance(key, Wallet) else key
+
+
+def _apply_rollup(connection, user_id, month, wallet_id, category_id, kind, basis, total, count):
+    rollup = MonthlyRollup.__table__
+    where = (
+        (rollup.c.user_id == user_id) & (rollup.c.month == month) &
+        (rollup.c.wallet_id == wallet_id) & (rollup.c.category_id == category_id) &
+        (rollup.c.kind == kind) & (rollup.c.basis == basis)
+    )
+
+    result = connection.execute(
+        update(rollup).where(where).values(total=rollup.c.total + total, tx_count=rollup.c.tx_count + count)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(rollup).values(
+            user_id=user_id, month=month, wallet_id=wallet_id, category_id=category_id,
+            kind=kind, basis=basis, total=total, tx_count=count
+        ))
+    elif count < 0:
+        connection.execute(delete(rollup).where(where, rollup.c.tx_count <= 0))
+
+
+def _apply_rollups_batch(connection, rollups):
+    """Versão em lote de _apply_rollup, usada sempre que o flush altera mais de uma chave de rollup.
+
+    Uma consulta identifica as chaves já existentes; as demais são inseridas com um
+    único executemany, e as existentes atualizadas com outro.
+    """
+    rollup = MonthlyRollup.__table__
+    key_columns = (rollup.c.user_id, rollup.c.month, rollup.c.wallet_id,
+                   rollup.c.category_id, rollup.c.kind, rollup.c.basis)
+    user_ids = {key[0] for key, _, _ in rollups}
+    months = {key[1] for key, _, _ in rollups}
+
+    existing = set(
+        tuple(row) for row in connection.execute(
+            db.select(*key_columns).where(rollup.c.user_id.in_(user_ids), rollup.c.month.in_(months))
+        )
+    )
+
+    names = ('b_user_id', 'b_month', 'b_wallet_id', 'b_category_id', 'b_kind', 'b_basis')
+    updates = [dict(zip(names, key), b_total=total, b_count=count) for key, total, count in rollups if key in existing]
+    inserts = [
+        dict(zip(('user_id', 'month', 'wallet_id', 'category_id', 'kind', 'basis'), key), total=total, tx_count=count)
+        for key, total, count in rollups if key not in existing
+    ]
+
+    if updates:
+        connection.execute(
+            update(rollup)
+            .where(*(column == bindparam(name) for column, name in zip(key_columns, names)))
+            .values(total=rollup.c.total + bindparam('b_total'), tx_count=rollup.c.tx_count + bindparam('b_count')),
+            updates
+        )
+    if inserts:
+        connection.execute(insert(rollup), inserts)
+    if any(count < 0 for _, _, count in rollups):
+        connection.execute(delete(rollup).where(rollup.c.user_id.in_(user_ids), rollup.c.tx_count <= 0))
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_ledger_changes(session, flush_context, instances):
+    delta = LedgerDelta()
+
+    for obj in session.new:
+        if type(obj) in SETTLEMENT:
+            delta.add_row(_row_state(obj), 1)
+        elif isinstance(obj, Wallet):
+            delta.add_wallet(obj, obj.initial_balance)
+        if isinstance(obj, VERSIONED_MODELS):
+            delta.touch_user(obj.user_id)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        if type(obj) in SETTLEMENT:
+            delta.add_row(_row_state(obj, previous=True), -1)
+            delta.add_row(_row_state(obj), 1)
+        elif isinstance(obj, Wallet):
+            old_initial = _previous_value(obj, 'initial_balance') or Decimal(0)
+            delta.add_wallet(obj.id, Decimal(obj.initial_balance) - Decimal(old_initial))
+        if isinstance(obj, VERSIONED_MODELS):
+            delta.touch_user(obj.user_id)
+
+    for obj in session.deleted:
+        if type(obj) in SETTLEMENT:
+            delta.add_row(_row_state(obj, previous=True), -1)
+        if isinstance(obj, VERSIONED_MODELS):
+            delta.touch_user(obj.user_id)
+
+    session.info['ledger_delta'] = delta
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def apply_ledger_changes(session, flush_context):
+    delta = session.info.pop('ledger_delta', None)
+    if delta is not None:
+        delta.apply(session)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def discard_ledger_changes(session, previous_transaction):
+    session.info.pop('ledger_delta', None)
+
+
+def _load_previous_on_set(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history garante que o valor anterior seja carregado mesmo quando o
+# atributo estava expirado, para que o delta do flush seja calculado corretamente.
+for _model in SETTLEMENT:
+    for _key in TRACKED_ATTRIBUTES:
+        if hasattr(_model, _key):
+            event.listen(getattr(_model, _key), 'set', _load_previous_on_set, active_history=True)
+event.listen(Wallet.initial_balance, 'set', _load_previous_on_set, active_history=True)
+
+
+def reconcile_balances(fix=True):
+    """Recalcula o saldo materializado de todas as carteiras e retorna as divergências.
+
+    Cada divergência é uma tupla (wallet_id, nome, saldo gravado, saldo esperado).
+    """
+    drifts = []
+    for wallet, received, paid in db.session.execute(Wallet.totals_query()):
+        stored = Decimal(wallet.balance or 0).quantize(Decimal('0.01'))
+        expected = (wallet.initial_balance + Decimal(received or 0) - Decimal(paid or 0)).quantize(Decimal('0.01'))
+        if stored != expected:
+            drifts.append((wallet.id, wallet.name, stored, expected))
+
+    if fix and drifts:
+        wallet_table = Wallet.__table__
+        connection = db.session.connection()
+        for wallet_id, _, _, expected in drifts:
+            connection.execute(
+                update(wallet_table).where(wallet_table.c.id == wallet_id).values(balance=expected)
+            )
+        db.session.commit()
+
+    return drifts
+
+
+def rebuild_rollups(user_id=None):
+    """Recria a tabela monthly_rollup a partir dos lançamentos (backfill de bancos existentes).
+
+    Retorna a quantidade de linhas de rollup gravadas.
+    """
+    rollup = MonthlyRollup.__table__
+    purge = delete(rollup)
+    if user_id is not None:
+        purge = purge.where(rollup.c.user_id == user_id)
+    db.session.execute(purge)
+
+    written = 0
+    for model, (settled_attr, settled_at_attr, _, kind) in SETTLEMENT.items():
+        settled_at = getattr(model, settled_at_attr)
+        sources = (
+            ('projected', model.due_date, []),
+            ('realized', settled_at, [getattr(model, settled_attr) == True, settled_at.isnot(None)]),
+        )
+
+        for basis, when, conditions in sources:
+            year, month = extract('year', when).label('year'), extract('month', when).label('month')
+            query = db.select(
+                model.user_id, year, month, model.wallet_id, model.category_id,
+                func.sum(model.amount), func.count(model.id)
+            ).where(*conditions).group_by(model.user_id, year, month, model.wallet_id, model.category_id)
+            if user_id is not None:
+                query = query.where(model.user_id == user_id)
+
+            rows = [
+                dict(user_id=row_user, month=date(int(row_year), int(row_month), 1), wallet_id=wallet_id,
+                     category_id=category_id, kind=kind, basis=basis, total=total, tx_count=count)
+                for row_user, row_year, row_month, wallet_id, category_id, total, count in db.session.execute(query)
+            ]
+            if rows:
+                db.session.execute(insert(rollup), rows)
+                written += len(rows)
+
+    db.session.commit()
+    return written
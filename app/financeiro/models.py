@@ -1,12 +1,13 @@
 from app.extensions import db
 from datetime import datetime, date
-from sqlalchemy import func 
+from sqlalchemy import func, case
 from decimal import Decimal
 
 class Wallet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     initial_balance = db.Column(db.Numeric(10, 2), default=0.00, nullable=False)
+    balance = db.Column(db.Numeric(10, 2), default=0.00, server_default='0', nullable=False)
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -18,22 +19,71 @@ class Wallet(db.Model):
 
     @property
     def current_balance(self):
-        total_receipts = db.session.scalar(
-            db.select(func.coalesce(func.sum(RevenueTransaction.amount), Decimal(0))).where(
-                RevenueTransaction.wallet_id == self.id,
-                RevenueTransaction.is_received == True
-            ))
-        
-        total_paid_expenses = db.session.scalar(
-            db.select(func.coalesce(func.sum(Expense.amount), Decimal(0))).where( 
-                Expense.wallet_id == self.id,
-                Expense.is_paid == True
-            ))
-        
-        receipts = total_receipts if total_receipts is not None else Decimal(0)
-        paid_expenses = total_paid_expenses if total_paid_expenses is not None else Decimal(0)
-
-        return self.initial_balance + receipts - paid_expenses
+        # Saldo materializado, mantido incrementalmente por app.financeiro.ledger
+        return self.balance if self.balance is not None else self.initial_balance
+
+    @classmethod
+    def totals_query(cls, user_id=None):
+        """SELECT das carteiras com o total recebido e o total pago de cada uma, lidos dos lançamentos.
+
+        Varre receitas e despesas: usado só na conferência (reconcile_balances), não nas páginas.
+        """
+        received = db.select(
+            RevenueTransaction.wallet_id.label('wallet_id'),
+            func.sum(RevenueTransaction.amount).label('total')
+        ).where(RevenueTransaction.is_received == True)
+
+        paid = db.select(
+            Expense.wallet_id.label('wallet_id'),
+            func.sum(Expense.amount).label('total')
+        ).where(Expense.is_paid == True)
+
+        query = db.select(cls)
+        if user_id is not None:
+            received = received.where(RevenueTransaction.user_id == user_id)
+            paid = paid.where(Expense.user_id == user_id)
+            query = query.where(cls.user_id == user_id)
+
+        received = received.group_by(RevenueTransaction.wallet_id).subquery()
+        paid = paid.group_by(Expense.wallet_id).subquery()
+
+        return query.add_columns(
+            func.coalesce(received.c.total, 0).label('received'),
+            func.coalesce(paid.c.total, 0).label('paid')
+        ).outerjoin(received, received.c.wallet_id == cls.id) \
+         .outerjoin(paid, paid.c.wallet_id == cls.id) \
+         .order_by(cls.id)
+
+    @classmethod
+    def balances_for_user(cls, user_id):
+        """Recebido, pago e saldo de todas as carteiras do usuário em uma única consulta.
+
+        O saldo é o materializado (Wallet.balance); recebido e pago somam os rollups 'realized'
+        do monthly_rollup, sem varrer receitas e despesas.
+        Retorna {wallet_id: {'wallet', 'received', 'paid', 'net'}} na ordem de criação das carteiras.
+        """
+        totals = db.select(
+            MonthlyRollup.wallet_id.label('wallet_id'),
+            func.sum(case((MonthlyRollup.kind == 'revenue', MonthlyRollup.total), else_=0)).label('received'),
+            func.sum(case((MonthlyRollup.kind == 'expense', MonthlyRollup.total), else_=0)).label('paid')
+        ).where(MonthlyRollup.user_id == user_id, MonthlyRollup.basis == 'realized') \
+         .group_by(MonthlyRollup.wallet_id).subquery()
+
+        query = db.select(
+            cls,
+            func.coalesce(totals.c.received, 0),
+            func.coalesce(totals.c.paid, 0)
+        ).outerjoin(totals, totals.c.wallet_id == cls.id).where(cls.user_id == user_id).order_by(cls.id)
+
+        balances = {}
+        for wallet, received, paid in db.session.execute(query):
+            balances[wallet.id] = {
+                'wallet': wallet,
+                'received': Decimal(received or 0),
+                'paid': Decimal(paid or 0),
+                'net': wallet.balance,
+            }
+        return balances
     
 
 class RevenueCategory(db.Model):
@@ -78,12 +128,19 @@ class RevenueTransaction(db.Model):
     is_recurrent = db.Column(db.Boolean, default=False, nullable=False)
     frequency = db.Column(db.String(50), nullable=True)
     last_launch_date = db.Column(db.DateTime, nullable=True)
+    next_run_at = db.Column(db.Date, nullable=True, index=True)
     
     type = db.Column(db.String(1), default='R', nullable=False) 
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     wallet_id = db.Column(db.Integer, db.ForeignKey('wallet.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('revenue_category.id'), nullable=False)
+
+    # Índices compostos das consultas por usuário + situação + data (listas, dashboard, notificações)
+    __table_args__ = (
+        db.Index('ix_revenue_user_received_due', 'user_id', 'is_received', 'due_date'),
+        db.Index('ix_revenue_user_received_receipt', 'user_id', 'is_received', 'receipt_date'),
+    )
     
     def __repr__(self):
         return f'<RevenueTransaction {self.description} | R${self.amount} | Recebido: {self.is_received}>'
@@ -101,11 +158,17 @@ class Expense(db.Model):
     is_recurrent = db.Column(db.Boolean, default=False, nullable=False)
     frequency = db.Column(db.String(50), nullable=True)
     last_launch_date = db.Column(db.DateTime, nullable=True)
+    next_run_at = db.Column(db.Date, nullable=True, index=True)
     
     category_id = db.Column(db.Integer, db.ForeignKey('expense_category.id'), nullable=False)
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     wallet_id = db.Column(db.Integer, db.ForeignKey('wallet.id'), nullable=False) 
+
+    __table_args__ = (
+        db.Index('ix_expense_user_paid_due', 'user_id', 'is_paid', 'due_date'),
+        db.Index('ix_expense_user_paid_payment', 'user_id', 'is_paid', 'payment_date'),
+    )
     
     def __repr__(self):
         return f'<Expense {self.description} | R${self.amount} | Pago: {self.is_paid}>'
@@ -124,3 +187,23 @@ class Transfer(db.Model):
 
     def __repr__(self):
         return f'<Transfer R${self.amount} from {self.source_wallet.name} to {self.target_wallet.name}>'
+
+class MonthlyRollup(db.Model):
+    """Totais mensais pré-agregados, mantidos pelos eventos de flush em app.financeiro.ledger.
+
+    kind: 'revenue' ou 'expense'. basis: 'projected' (mês do vencimento, todos os
+    lançamentos) ou 'realized' (mês do recebimento/pagamento, apenas os baixados).
+    """
+    __tablename__ = 'monthly_rollup'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    wallet_id = db.Column(db.Integer, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)
+    basis = db.Column(db.String(10), primary_key=True)
+
+    total = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    tx_count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<MonthlyRollup {self.kind}/{self.basis} {self.month:%Y-%m} R${self.total}>'
@@ -0,0 +1,299 @@
+from app.extensions import db, cache
+from .models import Wallet, RevenueCategory, ExpenseCategory, RevenueTransaction, Expense, Transfer
+from sqlalchemy.orm import aliased
+from .search import description_filter
+from .ledger import SETTLEMENT
+from sqlalchemy import and_, or_, case, func
+from datetime import datetime, date, timedelta
+import base64
+import json
+
+BULK_CHUNK_SIZE = 500
+PENDING_WINDOW = 50
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def revenue_filters(args):
+    """Condições dos filtros da listagem de receitas, a partir dos parâmetros da URL."""
+    filters = []
+
+    desc_filter = args.get('desc_filter')
+    cat_filter_id = args.get('category_filter', type=int)
+    wallet_filter_id = args.get('wallet_filter', type=int)
+    date_start = args.get('date_start')
+    date_end = args.get('date_end')
+
+    if desc_filter:
+        filters.append(description_filter(RevenueTransaction, desc_filter))
+    if cat_filter_id:
+        filters.append(RevenueTransaction.category_id == cat_filter_id)
+    if wallet_filter_id:
+        filters.append(RevenueTransaction.wallet_id == wallet_filter_id)
+    if date_start:
+        filters.append(RevenueTransaction.date >= _parse_date(date_start))
+    if date_end:
+        filters.append(RevenueTransaction.date <= _parse_date(date_end))
+
+    return filters
+
+
+def expense_filters(args):
+    """Condições dos filtros da listagem de despesas, a partir dos parâmetros da URL."""
+    filters = []
+
+    desc_filter = args.get('desc_filter')
+    item_filter_id = args.get('item_filter', type=int)
+    recurrency_filter = args.get('recurrency_filter')
+    wallet_filter_id = args.get('wallet_filter', type=int)
+    date_start = args.get('date_start')
+    date_end = args.get('date_end')
+
+    if desc_filter:
+        filters.append(description_filter(Expense, desc_filter))
+    if item_filter_id:
+        filters.append(Expense.category_id == item_filter_id)
+    if wallet_filter_id:
+        filters.append(Expense.wallet_id == wallet_filter_id)
+
+    if recurrency_filter == 'Isolada':
+        filters.append(Expense.is_recurrent == False)
+    elif recurrency_filter == 'Recorrente':
+        filters.append(Expense.is_recurrent == True)
+    elif recurrency_filter:
+        filters.append(Expense.frequency == recurrency_filter)
+
+    if date_start:
+        filters.append(Expense.due_date >= _parse_date(date_start))
+    if date_end:
+        filters.append(Expense.due_date <= _parse_date(date_end))
+
+    return filters
+
+
+def _listing(model, category_model, settled_column, user_id):
+    return db.session.query(
+        model.id, model.description, model.amount, model.due_date, settled_column,
+        category_model.name.label('category_name'), Wallet.name.label('wallet_name')
+    ).join(category_model, model.category_id == category_model.id) \
+     .join(Wallet, model.wallet_id == Wallet.id) \
+     .filter(model.user_id == user_id)
+
+
+def revenue_listing(user_id):
+    """Receitas do usuário como linhas leves (só as colunas exibidas), já com os nomes da
+    categoria e da carteira: a listagem não carrega objetos ORM nem faz lazy load por linha."""
+    return _listing(RevenueTransaction, RevenueCategory, RevenueTransaction.receipt_date, user_id)
+
+
+def expense_listing(user_id):
+    """Despesas do usuário como linhas leves, já com os nomes da categoria e da carteira."""
+    return _listing(Expense, ExpenseCategory, Expense.payment_date, user_id)
+
+
+def recent_transfers(user_id, limit=10):
+    """Últimas transferências com os nomes das carteiras de origem e destino."""
+    source, target = aliased(Wallet), aliased(Wallet)
+    return db.session.query(
+        Transfer.id, Transfer.amount, Transfer.date,
+        source.name.label('source_name'), target.name.label('target_name')
+    ).join(source, Transfer.source_wallet_id == source.id) \
+     .join(target, Transfer.target_wallet_id == target.id) \
+     .filter(Transfer.user_id == user_id) \
+     .order_by(Transfer.date.desc()).limit(limit).all()
+
+
+def selected_id_chunks(model, user_id, ids=None, conditions=None, chunk_size=BULK_CHUNK_SIZE):
+    """Lotes de ids do usuário para uma ação em massa.
+
+    Usa os ids enviados pelo formulário ou, com ids=None, todos os lançamentos que atendem
+    a conditions ("selecionar todos do filtro"), percorridos por id sem OFFSET.
+    """
+    if ids is not None:
+        ids = sorted({int(value) for value in ids if str(value).isdigit()})
+        for start in range(0, len(ids), chunk_size):
+            yield ids[start:start + chunk_size]
+        return
+
+    last_id = 0
+    while True:
+        chunk = db.session.scalars(
+            db.select(model.id)
+            .where(model.user_id == user_id, model.id > last_id, *(conditions or []))
+            .order_by(model.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def encode_cursor(value, row_id, page):
+    """Cursor opaco de paginação: posição (valor da coluna de ordenação, id) e número da página."""
+    payload = json.dumps([value.isoformat() if value is not None else None, row_id, page])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, value_type=datetime):
+    try:
+        value, row_id, page = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return (value_type.fromisoformat(value) if value is not None else None), int(row_id), int(page)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """Página de uma listagem paginada por chave (seek), com cursores para a anterior e a próxima."""
+
+    def __init__(self, items, page, per_page, has_prev, has_next, prev_cursor=None, next_cursor=None, total=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(1, -(-self.total // self.per_page))
+
+
+def _seek(query, column, per_page, position, forward):
+    """Até per_page + 1 itens após (forward) ou antes de position, na ordem (column desc, id desc).
+
+    Valores nulos de column formam um segmento no fim da lista; cada consulta percorre um
+    só segmento para continuar usando o índice de (column). O seek é escrito como
+    column <= value AND (column < value OR id < row_id): com o OR sozinho o SQLite une dois
+    intervalos do índice e ordena tudo o que vem depois do cursor numa B-tree temporária.
+    """
+    model = query.column_descriptions[0]['entity']
+    limit = per_page + 1
+    value, row_id = position if position else (None, None)
+
+    if forward:
+        if position is None or value is not None:
+            seek = query.filter(column.isnot(None))
+            if position is not None:
+                seek = seek.filter(column <= value, or_(column < value, model.id < row_id))
+            items = seek.order_by(column.desc(), model.id.desc()).limit(limit).all()
+            null_filter = []
+        else:
+            items = []
+            null_filter = [model.id < row_id]
+        if len(items) < limit:
+            items += query.filter(column.is_(None), *null_filter) \
+                .order_by(model.id.desc()).limit(limit - len(items)).all()
+        return items
+
+    if value is None:
+        items = query.filter(column.is_(None), model.id > row_id).order_by(model.id.asc()).limit(limit).all()
+        seek = query.filter(column.isnot(None))
+    else:
+        items = []
+        seek = query.filter(column >= value, or_(column > value, model.id > row_id))
+    if len(items) < limit:
+        items += seek.order_by(column.asc(), model.id.asc()).limit(limit - len(items)).all()
+    return items
+
+
+def keyset_paginate(query, column, per_page, cursor=None, total=None):
+    """Pagina query por (column desc, id desc) sem OFFSET nem COUNT; o custo não cresce com a página.
+
+    cursor vem de KeysetPage.next_cursor/prev_cursor ('n...' ou 'p...'); total, se informado,
+    é só exibido (ver cached_summary).
+    """
+    direction, position, page = 'n', None, 1
+    decoded = decode_cursor(cursor[1:], column.type.python_type) if cursor and cursor[0] in 'np' else None
+    if decoded:
+        direction, page = cursor[0], decoded[2]
+        position = decoded[:2]
+
+    forward = direction == 'n'
+    items = _seek(query, column, per_page, position, forward)
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if forward:
+        has_prev, has_next = position is not None, has_more
+    else:
+        items.reverse()
+        has_prev, has_next = has_more, True
+        if not has_prev:
+            page = 1
+
+    key = column.key
+    first, last = (items[0], items[-1]) if items else (None, None)
+    return KeysetPage(
+        items, page, per_page, has_prev, has_next,
+        prev_cursor='p' + encode_cursor(getattr(first, key), first.id, page - 1) if has_prev and first else None,
+        next_cursor='n' + encode_cursor(getattr(last, key), last.id, page + 1) if has_next and last else None,
+        total=total,
+    )
+
+
+def pending_window(query, column, size=PENDING_WINDOW, cursor=None):
+    """Janela de até size lançamentos pendentes na ordem (column asc, id asc), a partir de cursor.
+
+    Usada na carga inicial da aba de pendentes e nos fragmentos da rolagem infinita;
+    retorna (itens, cursor da próxima janela ou None). column não pode ser nula.
+    """
+    model = query.column_descriptions[0]['entity']
+    decoded = decode_cursor(cursor, column.type.python_type) if cursor else None
+    window = 0
+    if decoded:
+        value, row_id, window = decoded
+        query = query.filter(or_(column > value, and_(column == value, model.id > row_id)))
+
+    items = query.order_by(column.asc(), model.id.asc()).limit(size + 1).all()
+    if len(items) <= size:
+        return items, None
+    items = items[:size]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, column.key), last.id, window + 1)
+
+
+def listing_summary(model, user_id, filters, today=None):
+    """Totais e contagens de uma listagem com os filtros ativos, em uma única consulta.
+
+    Agregação condicional (SUM/COUNT de CASE) sobre os lançamentos do usuário: liquidados,
+    pendentes, pendentes atrasados e pendentes que vencem no mês corrente.
+    """
+    today = today or date.today()
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+    settled = getattr(model, SETTLEMENT[model][0]) == True
+    pending = getattr(model, SETTLEMENT[model][0]) == False
+    buckets = {
+        'settled': settled,
+        'pending': pending,
+        'overdue': and_(pending, model.due_date < today),
+        'month': and_(pending, model.due_date >= month_start, model.due_date < next_month),
+    }
+
+    columns = []
+    for name, condition in buckets.items():
+        columns.append(func.coalesce(func.sum(case((condition, model.amount), else_=0)), 0).label(f'{name}_total'))
+        columns.append(func.count(case((condition, 1))).label(f'{name}_count'))
+
+    row = db.session.execute(db.select(*columns).where(model.user_id == user_id, *filters)).one()
+    return dict(row._mapping)
+
+
+def cached_summary(model, name, user, args, filters):
+    """listing_summary guardado no cache de payloads.
+
+    A chave inclui User.data_version, o dia (atrasados e "no mês" dependem dele) e os filtros
+    (sem o cursor), então o agregado só é refeito depois de uma escrita do usuário ou com outro filtro.
+    """
+    today = date.today()
+    params = tuple(sorted((k, v) for k, v in args.items(multi=True) if k not in ('cursor', 'page', 'after')))
+    key = ('summary', name, user.id, user.data_version, today.isoformat(), params)
+    return cache.get_or_set(key, lambda: listing_summary(model, user.id, filters, today))
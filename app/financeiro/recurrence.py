@@ -0,0 +1,71 @@
+from dateutil.relativedelta import relativedelta
+
+# Frequência -> unidade do relativedelta
+FREQUENCY_UNITS = {
+    'daily': 'days',
+    'weekly': 'weeks',
+    'monthly': 'months',
+    'yearly': 'years',
+}
+
+
+def installment_dates(first_due, frequency, count):
+    """Vencimentos de count parcelas a partir de first_due (first_due + n períodos)."""
+    unit = FREQUENCY_UNITS[frequency]
+    return [first_due + relativedelta(**{unit: n}) for n in range(count)]
+
+
+def _periods_until(anchor, frequency, value):
+    """Limite inferior de quantos períodos cabem entre anchor e value (evita iterar desde o início)."""
+    if frequency == 'daily':
+        return (value - anchor).days
+    if frequency == 'weekly':
+        return (value - anchor).days // 7
+    if frequency == 'monthly':
+        return (value.year - anchor.year) * 12 + value.month - anchor.month - 1
+    return value.year - anchor.year - 1
+
+
+def occurrences_between(anchor, frequency, after, until):
+    """Datas de ocorrência de uma recorrência com início em anchor, no intervalo (after, until].
+
+    As datas são calculadas a partir de anchor (anchor + n períodos), e não encadeadas
+    umas nas outras, para que vencimentos no dia 31 não migrem para o dia 28.
+    """
+    unit = FREQUENCY_UNITS.get(frequency)
+    if unit is None or after >= until:
+        return []
+
+    n = max(1, _periods_until(anchor, frequency, after))
+    occurrences = []
+    while True:
+        current = anchor + relativedelta(**{unit: n})
+        if current > until:
+            break
+        if current > after:
+            occurrences.append(current)
+        n += 1
+    return occurrences
+
+
+def next_occurrence(anchor, frequency, after):
+    """Primeira ocorrência posterior a after, ou None se a frequência não for válida."""
+    unit = FREQUENCY_UNITS.get(frequency)
+    if unit is None:
+        return None
+
+    n = max(1, _periods_until(anchor, frequency, after))
+    while True:
+        current = anchor + relativedelta(**{unit: n})
+        if current > after:
+            return current
+        n += 1
+
+
+def schedule_next_run(template):
+    """Atualiza next_run_at de um lançamento após criação/edição (None se não for recorrente)."""
+    if not template.is_recurrent:
+        template.next_run_at = None
+        return
+    last_date = template.last_launch_date.date() if template.last_launch_date else template.due_date
+    template.next_run_at = next_occurrence(template.due_date, template.frequency, last_date)
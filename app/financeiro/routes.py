@@ -1,14 +1,21 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, get_template_attribute
 from werkzeug.exceptions import abort
 from flask_login import login_required, current_user
 from app.extensions import db
 from .models import Wallet, RevenueCategory, RevenueTransaction, ExpenseCategory, Expense, Transfer
 from .forms import WalletForm, RevenueCategoryForm, RevenueTransactionForm, ExpenseCategoryForm, ExpenseForm, TransferForm
+from .recurrence import schedule_next_run
+from .installments import create_installments
+from .queries import revenue_filters, expense_filters, selected_id_chunks, keyset_paginate, cached_summary, pending_window, \
+    revenue_listing, expense_listing, recent_transfers
+from .ledger import settle_where, delete_where
+from app.filters import format_currency
 from config import Config
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_, or_, extract
+from sqlalchemy import and_
 from decimal import Decimal
-from dateutil.relativedelta import relativedelta
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import MultiDict
 
 financeiro_bp = Blueprint('financeiro', __name__, template_folder='templates', url_prefix='/financeiro')
 footer = {'ano': Config.ANO_ATUAL, 'versao': Config.VERSAO_APP}
@@ -20,27 +27,29 @@ def flash_form_errors(form):
             field_label = field_obj.label.text if field_obj and hasattr(field_obj, 'label') else field_name
             flash(f"Erro no campo '{field_label}': {error}", 'danger')
 
-def calculate_next_date(start_date, frequency):
-    if frequency == 'daily':
-        return start_date + relativedelta(days=1)
-    elif frequency == 'weekly':
-        return start_date + relativedelta(weeks=1)
-    elif frequency == 'monthly':
-        return start_date + relativedelta(months=1)
-    elif frequency == 'yearly':
-        return start_date + relativedelta(years=1)
-    return start_date
+def bind_transfer_wallets(form, wallets, balances=None):
+    """Reaproveita a lista de carteiras já carregada nas opções do formulário de transferência."""
+    form.source_wallet.query_factory = lambda: wallets
+    form.target_wallet.query_factory = lambda: wallets
+
+    if balances:
+        label = lambda w: f"{w.name} ({format_currency(balances[w.id]['net'])})"
+        form.source_wallet.get_label = label
+        form.target_wallet.get_label = label
 
 @financeiro_bp.route('/carteiras')
 @login_required
 def wallets():
-    wallets = Wallet.query.filter_by(user_id=current_user.id).all()
+    balances = Wallet.balances_for_user(current_user.id)
+    wallets = [b['wallet'] for b in balances.values()]
     form = WalletForm()
     form_transfer = TransferForm()
-    transfers = Transfer.query.filter_by(user_id=current_user.id).order_by(Transfer.date.desc()).limit(10).all()
+    bind_transfer_wallets(form_transfer, wallets, balances)
+    transfers = recent_transfers(current_user.id)
     
     return render_template('financeiro/wallets.html', 
                            wallets=wallets, 
+                           balances=balances,
                            form=form, 
                            form_transfer=form_transfer,
                            transfers=transfers,
@@ -51,9 +60,7 @@ def wallets():
 @login_required
 def transfer():
     form = TransferForm()
-    
-    form.source_wallet.query_factory = lambda: Wallet.query.filter_by(user_id=current_user.id).all()
-    form.target_wallet.query_factory = lambda: Wallet.query.filter_by(user_id=current_user.id).all()
+    bind_transfer_wallets(form, Wallet.query.filter_by(user_id=current_user.id).all())
 
     if form.validate_on_submit():
         amount = form.amount.data
@@ -357,12 +364,10 @@ def delete_transaction(transaction_id):
 @financeiro_bp.route('/receitas')
 @login_required
 def revenues():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     now_date = date.today()
-    base_query = RevenueTransaction.query.filter_by(user_id=current_user.id)
-    filters = []
+    base_query = revenue_listing(current_user.id)
 
     desc_filter = request.args.get('desc_filter')
     cat_filter_id = request.args.get('category_filter', type=int)
@@ -370,42 +375,20 @@ def revenues():
     date_start = request.args.get('date_start')
     date_end = request.args.get('date_end')
 
-    if desc_filter:
-        filters.append(RevenueTransaction.description.ilike(f'%{desc_filter}%'))
-    
-    if cat_filter_id:
-        filters.append(RevenueTransaction.category_id == cat_filter_id)
-
-    if wallet_filter_id:
-        filters.append(RevenueTransaction.wallet_id == wallet_filter_id)
-        
-    if date_start:
-        filters.append(RevenueTransaction.date >= datetime.strptime(date_start, '%Y-%m-%d').date())
-        
-    if date_end:
-        filters.append(RevenueTransaction.date <= datetime.strptime(date_end, '%Y-%m-%d').date()) 
-    
+    filters = revenue_filters(request.args)
     if filters:
         query = base_query.filter(and_(*filters))
     else:
         query = base_query
 
-    total_received_amount = db.session.scalar(
-        db.select(func.coalesce(func.sum(RevenueTransaction.amount), Decimal(0))).where(
-            RevenueTransaction.user_id == current_user.id, RevenueTransaction.is_received == True
-        ).filter(and_(*filters))
-    )
-    total_received_amount = total_received_amount if total_received_amount is not None else Decimal(0)
-
-    total_receivable_amount = db.session.scalar(
-        db.select(func.coalesce(func.sum(RevenueTransaction.amount), Decimal(0))).where(
-            RevenueTransaction.user_id == current_user.id, RevenueTransaction.is_received == False
-        ).filter(and_(*filters))
-    )
-    total_receivable_amount = total_receivable_amount if total_receivable_amount is not None else Decimal(0)
-    
-    receivable_revenues = query.filter_by(is_received=False).order_by(RevenueTransaction.due_date.asc()).all()
-    received_pagination = query.filter_by(is_received=True).order_by(RevenueTransaction.receipt_date.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    summary = cached_summary(RevenueTransaction, 'revenues', current_user, request.args, filters)
+
+    receivable_revenues, pending_cursor = pending_window(query.filter(RevenueTransaction.is_received == False),
+                                                         RevenueTransaction.due_date)
+    received_query = query.filter(RevenueTransaction.is_received == True)
+    received_total = summary['settled_count'] if current_app.config.get('PAGINATION_TOTALS', True) else None
+    received_pagination = keyset_paginate(received_query, RevenueTransaction.receipt_date, per_page,
+                                          cursor=request.args.get('cursor'), total=received_total)
     received_revenues = received_pagination.items
     
     form = RevenueTransactionForm() 
@@ -418,9 +401,9 @@ def revenues():
     return render_template('financeiro/revenues.html', 
                            received_revenues=received_revenues,
                            receivable_revenues=receivable_revenues,
+                           pending_cursor=pending_cursor,
                            pagination=received_pagination,
-                           total_received_amount=total_received_amount,
-                           total_receivable_amount=total_receivable_amount,
+                           summary=summary,
                            title='Minhas Receitas',
                            now_date=now_date,
                            desc_filter=desc_filter,
@@ -432,6 +415,23 @@ def revenues():
                            wallet_choices=wallet_choices,
                            **footer)
 
+def pending_fragment(kind, items, next_cursor):
+    """Janela de pendentes como fragmentos HTML (linhas da tabela e cards do mobile) para a rolagem infinita."""
+    row = get_template_attribute('macros/pending.html', f'{kind}_pending_row')
+    card = get_template_attribute('macros/pending.html', f'{kind}_pending_card')
+    now_date = date.today()
+    return jsonify(rows=''.join(row(t, now_date) for t in items),
+                   cards=''.join(card(t, now_date) for t in items),
+                   next_cursor=next_cursor)
+
+@financeiro_bp.route('/receitas/pendentes')
+@login_required
+def revenues_pending():
+    query = revenue_listing(current_user.id).filter(RevenueTransaction.is_received == False,
+                                                    *revenue_filters(request.args))
+    items, next_cursor = pending_window(query, RevenueTransaction.due_date, cursor=request.args.get('after'))
+    return pending_fragment('revenue', items, next_cursor)
+
 @financeiro_bp.route('/receitas/add', methods=['GET', 'POST'])
 @login_required
 def add_revenue():
@@ -453,11 +453,27 @@ def add_revenue():
         frequency_for_template = form.frequency.data if is_recurrent_flag else None
         
         if num_repetitions > 0:
-            is_received = False
-            receipt_date = None
-        else:
-            is_received = (form.status.data == 'received')
-            receipt_date = datetime.combine(form.receipt_date.data, datetime.min.time()) if is_received and form.receipt_date.data else None
+            if not frequency or frequency == '':
+                 flash('A frequência é obrigatória para repetições em massa.', 'danger')
+                 return redirect(url_for('financeiro.add_revenue'))
+
+            total_lancamentos = create_installments(
+                RevenueTransaction, form.due_date.data, frequency, num_repetitions + 1,
+                form.amount.data, split=form.split_amount.data,
+                description=form.description.data,
+                date=form.date.data,
+                type='R',
+                user_id=current_user.id,
+                wallet_id=form.wallet.data.id,
+                category_id=form.category.data.id
+            )
+            db.session.commit()
+            msg = f'Receita registrada e mais {num_repetitions} lançamentos futuros criados (Total: {total_lancamentos}).'
+            flash(msg, 'success')
+            return redirect(url_for('financeiro.revenues'))
+
+        is_received = (form.status.data == 'received')
+        receipt_date = datetime.combine(form.receipt_date.data, datetime.min.time()) if is_received and form.receipt_date.data else None
             
         revenue = RevenueTransaction(
             description=form.description.data,
@@ -475,41 +491,8 @@ def add_revenue():
             wallet_id=form.wallet.data.id,
             category_id=form.category.data.id
         )
+        schedule_next_run(revenue)
         db.session.add(revenue)
-
-        if num_repetitions > 0:
-            if not frequency or frequency == '':
-                 flash('A frequência é obrigatória para repetições em massa.', 'danger')
-                 db.session.rollback()
-                 return redirect(url_for('financeiro.add_revenue'))
-                 
-            current_due_date = form.due_date.data
-            for _ in range(num_repetitions):
-                current_due_date = calculate_next_date(current_due_date, frequency)
-                
-                new_revenue = RevenueTransaction(
-                    description=form.description.data,
-                    amount=form.amount.data,
-                    date=form.date.data, 
-                    due_date=current_due_date,
-                    is_received=False, 
-                    receipt_date=None, 
-                    
-                    is_recurrent=False, 
-                    frequency=None,
-                    
-                    type='R',
-                    user_id=current_user.id,
-                    wallet_id=form.wallet.data.id,
-                    category_id=form.category.data.id
-                )
-                db.session.add(new_revenue)
-            
-            db.session.commit()
-            total_lancamentos = num_repetitions + 1
-            msg = f'Receita registrada e mais {num_repetitions} lançamentos futuros criados (Total: {total_lancamentos}).'
-            flash(msg, 'success')
-            return redirect(url_for('financeiro.revenues'))
         
         db.session.commit()
         
@@ -557,6 +540,7 @@ def edit_revenue(revenue_id):
         revenue.category_id = form.category.data.id
         revenue.is_recurrent = form.is_recurrent.data
         revenue.frequency = form.frequency.data if form.is_recurrent.data else None
+        schedule_next_run(revenue)
         
         if is_received_new:
             revenue.is_received = True
@@ -615,12 +599,11 @@ def mark_as_received(revenue_id):
 @financeiro_bp.route('/despesas')
 @login_required
 def expenses():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     now_date = date.today()
     
-    base_query = Expense.query.filter_by(user_id=current_user.id)
+    base_query = expense_listing(current_user.id)
 
     desc_filter = request.args.get('desc_filter')
     item_filter_id = request.args.get('item_filter', type=int)
@@ -628,57 +611,19 @@ def expenses():
     wallet_filter_id = request.args.get('wallet_filter', type=int)
     date_start = request.args.get('date_start')
     date_end = request.args.get('date_end')
-    
-    filters = []
-
-    if desc_filter:
-        filters.append(Expense.description.ilike(f'%{desc_filter}%'))
-    
-    if item_filter_id:
-        filters.append(Expense.category_id == item_filter_id)
-    
-    if wallet_filter_id:
-        filters.append(Expense.wallet_id == wallet_filter_id)
-        
-    if recurrency_filter and recurrency_filter == 'Isolada':
-        filters.append(Expense.is_recurrent == False)
-    elif recurrency_filter and recurrency_filter == 'Recorrente':
-        filters.append(Expense.is_recurrent == True)
-    elif recurrency_filter:
-        filters.append(Expense.frequency == recurrency_filter)
-        
-    if date_start:
-        filters.append(Expense.due_date >= datetime.strptime(date_start, '%Y-%m-%d').date())
-        
-    if date_end:
-        filters.append(Expense.due_date <= datetime.strptime(date_end, '%Y-%m-%d').date())
 
+    filters = expense_filters(request.args)
     if filters:
         base_query = base_query.filter(and_(*filters))
 
-    total_paid_query = db.session.scalar(
-        db.select(func.coalesce(func.sum(Expense.amount), Decimal(0))).where(
-            Expense.user_id == current_user.id,
-            Expense.is_paid == True
-        )
-    )
-    total_paid_amount = total_paid_query if total_paid_query is not None else Decimal(0)
-    
-    total_pending_query = db.session.scalar(
-        db.select(func.coalesce(func.sum(Expense.amount), Decimal(0))).where(
-            Expense.user_id == current_user.id,
-            Expense.is_paid == False
-        )
-    )
-    total_pending_amount = total_pending_query if total_pending_query is not None else Decimal(0)
+    summary = cached_summary(Expense, 'expenses', current_user, request.args, filters)
 
-    pending_expenses = base_query.filter_by(is_paid=False) \
-                                    .order_by(Expense.due_date.asc()) \
-                                    .all()
+    pending_expenses, pending_cursor = pending_window(base_query.filter(Expense.is_paid == False), Expense.due_date)
 
-    paid_pagination = base_query.filter_by(is_paid=True) \
-                                   .order_by(Expense.payment_date.desc()) \
-                                   .paginate(page=page, per_page=per_page, error_out=False)
+    paid_query = base_query.filter(Expense.is_paid == True)
+    paid_total = summary['settled_count'] if current_app.config.get('PAGINATION_TOTALS', True) else None
+    paid_pagination = keyset_paginate(paid_query, Expense.payment_date, per_page,
+                                      cursor=request.args.get('cursor'), total=paid_total)
     
     paid_expenses = paid_pagination.items
 
@@ -696,9 +641,9 @@ def expenses():
     return render_template('financeiro/expenses.html',
                            paid_expenses=paid_expenses,
                            pending_expenses=pending_expenses,
+                           pending_cursor=pending_cursor,
                            pagination=paid_pagination,
-                           total_paid_amount=total_paid_amount,
-                           total_pending_amount=total_pending_amount,
+                           summary=summary,
                            frequency_choices=frequency_choices,
                            title='Minhas Despesas', 
                            now_date=now_date,
@@ -712,6 +657,13 @@ def expenses():
                            wallet_choices=wallet_choices,
                            **footer)
 
+@financeiro_bp.route('/despesas/pendentes')
+@login_required
+def expenses_pending():
+    query = expense_listing(current_user.id).filter(Expense.is_paid == False, *expense_filters(request.args))
+    items, next_cursor = pending_window(query, Expense.due_date, cursor=request.args.get('after'))
+    return pending_fragment('expense', items, next_cursor)
+
 @financeiro_bp.route('/despesas/add', methods=['GET', 'POST'])
 @login_required
 def add_expense():
@@ -734,13 +686,35 @@ def add_expense():
         is_recurrent_flag = form.is_recurrent.data and num_repetitions == 0 
         frequency_for_template = form.frequency.data if is_recurrent_flag else None
 
+        payment_date = datetime.combine(form.payment_date.data, datetime.min.time()) if is_paid and form.payment_date.data else None
+
+        if num_repetitions > 0:
+            if not frequency or frequency == '':
+                 flash('A frequência é obrigatória para repetições em massa.', 'danger')
+                 return redirect(url_for('financeiro.add_expense'))
+
+            total_lancamentos = create_installments(
+                Expense, form.due_date.data, frequency, num_repetitions + 1,
+                form.amount.data, split=form.split_amount.data,
+                settle_first=is_paid, settled_at=payment_date,
+                description=form.description.data,
+                date=form.date.data,
+                user_id=current_user.id,
+                wallet_id=form.wallet.data.id,
+                category_id=form.item.data.id
+            )
+            db.session.commit()
+            msg = f'Despesa registrada e mais {num_repetitions} lançamentos futuros criados (Total: {total_lancamentos}).'
+            flash(msg, 'success')
+            return redirect(url_for('financeiro.expenses'))
+
         expense = Expense(
             description=form.description.data,
             amount=form.amount.data,
             date=form.date.data,
             due_date=form.due_date.data,
             is_paid=is_paid,
-            payment_date=datetime.combine(form.payment_date.data, datetime.min.time()) if is_paid and form.payment_date.data else None,
+            payment_date=payment_date,
             
             is_recurrent=is_recurrent_flag,
             frequency=frequency_for_template,
@@ -749,41 +723,9 @@ def add_expense():
             wallet_id=form.wallet.data.id,
             category_id=form.item.data.id
         )
+        schedule_next_run(expense)
         
         db.session.add(expense)
-
-        if num_repetitions > 0:
-            if not frequency or frequency == '':
-                 flash('A frequência é obrigatória para repetições em massa.', 'danger')
-                 db.session.rollback()
-                 return redirect(url_for('financeiro.add_expense'))
-                 
-            current_due_date = form.due_date.data
-            for _ in range(num_repetitions):
-                current_due_date = calculate_next_date(current_due_date, frequency)
-                
-                new_expense = Expense(
-                    description=form.description.data,
-                    amount=form.amount.data,
-                    date=form.date.data,
-                    due_date=current_due_date,
-                    is_paid=False, 
-                    payment_date=None, 
-                    
-                    is_recurrent=False,
-                    frequency=None,
-                    
-                    user_id=current_user.id,
-                    wallet_id=form.wallet.data.id,
-                    category_id=form.item.data.id
-                )
-                db.session.add(new_expense)
-            
-            db.session.commit()
-            total_lancamentos = num_repetitions + 1
-            msg = f'Despesa registrada e mais {num_repetitions} lançamentos futuros criados (Total: {total_lancamentos}).'
-            flash(msg, 'success')
-            return redirect(url_for('financeiro.expenses'))
             
         # 3. Lançamento único ou recorrente contínuo (se num_repetitions == 0)
         db.session.commit()
@@ -838,6 +780,7 @@ def edit_expense(expense_id):
         
         expense.is_recurrent = form.is_recurrent.data
         expense.frequency = form.frequency.data if form.is_recurrent.data else None
+        schedule_next_run(expense)
         
         db.session.commit()
         flash('Despesa atualizada com sucesso!', 'success')
@@ -893,41 +836,51 @@ def pay_expense(expense_id):
 
     return redirect(url_for('financeiro.expenses'))
 
+def run_bulk_action(model, action, settle_action, filters_for, status_column):
+    """Executa a ação em massa ('delete' ou settle_action) em lotes, sem carregar os lançamentos.
+
+    Com select_all_matching, age sobre todos os lançamentos do filtro enviado em filter_query
+    (restritos à aba de origem em scope); caso contrário, sobre os selected_ids.
+    Retorna a quantidade de lançamentos afetados, ou None se nada foi selecionado.
+    """
+    if request.form.get('select_all_matching'):
+        filter_args = MultiDict(parse_qsl(request.form.get('filter_query', '')))
+        conditions = filters_for(filter_args)
+        scope = request.form.get('scope')
+        if scope == 'settled':
+            conditions.append(status_column == True)
+        elif scope == 'pending':
+            conditions.append(status_column == False)
+        chunks = selected_id_chunks(model, current_user.id, conditions=conditions)
+    else:
+        ids = request.form.getlist('selected_ids')
+        if not ids:
+            return None
+        chunks = selected_id_chunks(model, current_user.id, ids=ids)
+
+    count = 0
+    for chunk in chunks:
+        where = [model.id.in_(chunk), model.user_id == current_user.id]
+        if action == 'delete':
+            count += delete_where(db.session, model, where)
+        elif action == settle_action:
+            count += settle_where(db.session, model, where, datetime.utcnow())
+        db.session.commit()
+    return count
+
 @financeiro_bp.route('/receitas/bulk', methods=['POST'])
 @login_required
 def bulk_action_revenues():
     action = request.form.get('action_type')
-    ids = request.form.getlist('selected_ids')
-    
-    if not ids:
-        flash('Nenhum item selecionado.', 'warning')
-        return redirect(url_for('financeiro.revenues'))
-    
-    # Filtra transações pelos IDs enviados E garante que pertencem ao usuário atual (segurança)
-    revenues = RevenueTransaction.query.filter(
-        RevenueTransaction.id.in_(ids), 
-        RevenueTransaction.user_id == current_user.id
-    ).all()
-    
-    count = 0
+
     try:
-        if action == 'delete':
-            count = len(revenues)
-            for rev in revenues:
-                db.session.delete(rev)
+        count = run_bulk_action(RevenueTransaction, action, 'receive', revenue_filters, RevenueTransaction.is_received)
+        if count is None:
+            flash('Nenhum item selecionado.', 'warning')
+        elif action == 'delete':
             flash(f'{count} receitas excluídas com sucesso.', 'success')
-            
         elif action == 'receive':
-            for rev in revenues:
-                if not rev.is_received:
-                    rev.is_received = True
-                    # Define a data de recebimento como agora, se não houver
-                    if not rev.receipt_date:
-                        rev.receipt_date = datetime.utcnow()
-                    count += 1
             flash(f'{count} receitas marcadas como recebidas.', 'success')
-            
-        db.session.commit()
     except Exception as e:
         db.session.rollback()
         flash(f'Erro na ação em massa: {e}', 'danger')
@@ -938,36 +891,15 @@ def bulk_action_revenues():
 @login_required
 def bulk_action_expenses():
     action = request.form.get('action_type')
-    ids = request.form.getlist('selected_ids')
-    
-    if not ids:
-        flash('Nenhum item selecionado.', 'warning')
-        return redirect(url_for('financeiro.expenses'))
-    
-    expenses = Expense.query.filter(
-        Expense.id.in_(ids), 
-        Expense.user_id == current_user.id
-    ).all()
-    
-    count = 0
+
     try:
-        if action == 'delete':
-            count = len(expenses)
-            for exp in expenses:
-                db.session.delete(exp)
+        count = run_bulk_action(Expense, action, 'pay', expense_filters, Expense.is_paid)
+        if count is None:
+            flash('Nenhum item selecionado.', 'warning')
+        elif action == 'delete':
             flash(f'{count} despesas excluídas com sucesso.', 'success')
-            
         elif action == 'pay':
-            for exp in expenses:
-                if not exp.is_paid:
-                    exp.is_paid = True
-                    # Define data de pagamento como agora, se não houver
-                    if not exp.payment_date:
-                        exp.payment_date = datetime.utcnow()
-                    count += 1
             flash(f'{count} despesas marcadas como pagas.', 'success')
-            
-        db.session.commit()
     except Exception as e:
         db.session.rollback()
         flash(f'Erro na ação em massa: {e}', 'danger')
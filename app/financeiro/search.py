@@ -0,0 +1,99 @@
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import table, column, select, and_
+
+from app.extensions import db
+from .models import RevenueTransaction, Expense
+
+# Tabelas FTS5 de conteúdo externo (rowid = id do lançamento), mantidas por triggers
+# criados na migração; ver migrations/versions/e41b7d2a9c35_busca_textual_nas_descricoes.py
+SEARCH_TABLES = {
+    RevenueTransaction: 'revenue_search',
+    Expense: 'expense_search',
+}
+
+_available = {}
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Filtro do autogenerate: ignora as tabelas FTS e as tabelas-sombra do FTS5 (<nome>_data,
+    <nome>_idx, ...), que existem só no banco e não nos modelos."""
+    if type_ == 'table' and reflected and compare_to is None:
+        return not any(name == t or name.startswith(f'{t}_') for t in SEARCH_TABLES.values())
+    return True
+
+
+def search_terms(text):
+    """Palavras da busca, sem pontuação nem operadores do FTS5."""
+    return re.findall(r'\w+', text or '')
+
+
+def match_expression(terms):
+    """Expressão MATCH: prefixo de cada palavra, todas obrigatórias ("alug casa" -> "alug"* "casa"*)."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_available(model):
+    """True se o banco tem a tabela FTS do modelo (SQLite com a migração aplicada)."""
+    engine = db.engine
+    name = SEARCH_TABLES[model]
+    key = (engine.url, name)
+    if key not in _available:
+        _available[key] = engine.dialect.name == 'sqlite' and db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+        ).first() is not None
+    return _available[key]
+
+
+def description_filter(model, text):
+    """Condição de busca na descrição, usada por revenue_filters/expense_filters.
+
+    Usa o índice FTS5 quando existe; senão cai para um ILIKE por palavra, com a mesma
+    semântica de "todas as palavras" (só que sem índice).
+    """
+    terms = search_terms(text)
+    if not terms:
+        return model.description.ilike(f'%{text}%')
+
+    if search_available(model):
+        fts = table(SEARCH_TABLES[model], column('rowid'), column('description'))
+        return model.id.in_(select(fts.c.rowid).where(fts.c.description.match(match_expression(terms))))
+
+    return and_(*(model.description.ilike(f'%{term}%') for term in terms))
+
+
+@contextmanager
+def search_index_suspended():
+    """Desliga os triggers de sincronização do FTS durante uma carga em massa e reindexa no final.
+
+    No FTS5 cada INSERT disparado por trigger grava um segmento próprio no índice (o trigger
+    roda num savepoint, que descarrega os termos pendentes), o que torna cargas grandes muito
+    lentas; um 'rebuild' único no final é ordens de grandeza mais rápido. Os triggers são
+    recriados com o SQL lido do sqlite_master, o mesmo da migração.
+    """
+    tables = [name for model, name in SEARCH_TABLES.items() if search_available(model)]
+    if not tables:
+        yield
+        return
+
+    connection = db.session.connection()
+    triggers = connection.execute(
+        db.text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND ("
+                + ' OR '.join(f"name LIKE '{name}\\_%' ESCAPE '\\'" for name in tables) + ')')
+    ).all()
+    for name, _ in triggers:
+        connection.exec_driver_sql(f'DROP TRIGGER {name}')
+    try:
+        yield
+    except BaseException:
+        # O rollback desfaz também o DROP TRIGGER se a carga não chegou a ser confirmada
+        db.session.rollback()
+        raise
+    finally:
+        connection = db.session.connection()
+        for _, sql in triggers:
+            connection.exec_driver_sql(sql.replace('CREATE TRIGGER ', 'CREATE TRIGGER IF NOT EXISTS ', 1))
+        for name in tables:
+            connection.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+        db.session.commit()
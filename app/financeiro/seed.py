@@ -0,0 +1,303 @@
+"""Gerador determinístico de dados sintéticos para testes de escala (comando `flask seed`).
+
+Os lançamentos são inseridos com INSERTs em lote direto nas tabelas, sem passar pelo flush do
+ORM; saldos, rollups mensais e contagens de notificação são recalculados no final, de uma vez.
+"""
+import math
+import random
+from bisect import bisect
+from itertools import accumulate
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.auth.models import User
+from .models import Wallet, RevenueCategory, ExpenseCategory, RevenueTransaction, Expense, Transfer
+from .recurrence import next_occurrence
+from .ledger import rebuild_rollups, reconcile_balances
+from .tasks import refresh_due_today_counts
+from .search import search_index_suspended
+
+SEED_CHUNK_SIZE = 20000
+MAX_AMOUNT = 999999.99
+
+# (categoria, mediana em R$, dispersão do log-normal, peso relativo, descrições)
+EXPENSE_PROFILES = [
+    ('Mercado', 320, 0.6, 22, ['Supermercado', 'Atacadão', 'Feira livre', 'Hortifruti', 'Padaria', 'Açougue']),
+    ('Restaurantes', 65, 0.7, 16, ['iFood', 'Restaurante', 'Lanchonete', 'Pizzaria', 'Cafeteria']),
+    ('Transporte', 45, 0.8, 14, ['Uber', '99 Pop', 'Combustível', 'Estacionamento', 'Pedágio', 'Bilhete único']),
+    ('Contas da casa', 160, 0.5, 8, ['Conta de luz', 'Conta de água', 'Internet fibra', 'Gás', 'Celular']),
+    ('Lazer', 120, 0.8, 7, ['Cinema', 'Show', 'Hotel', 'Passagem aérea', 'Ingresso']),
+    ('Saúde', 180, 0.9, 6, ['Farmácia', 'Consulta médica', 'Exame laboratorial', 'Dentista']),
+    ('Assinaturas', 35, 0.5, 6, ['Streaming de vídeo', 'Streaming de música', 'Armazenamento em nuvem', 'Academia']),
+    ('Casa', 150, 0.9, 5, ['Material de construção', 'Eletrodoméstico', 'Manutenção', 'Diarista']),
+    ('Moradia', 1400, 0.35, 4, ['Aluguel', 'Condomínio', 'IPTU']),
+    ('Vestuário', 180, 0.7, 4, ['Roupas', 'Calçados', 'Acessórios']),
+    ('Educação', 450, 0.6, 3, ['Mensalidade escolar', 'Curso online', 'Livros', 'Material escolar']),
+    ('Pets', 110, 0.7, 3, ['Ração', 'Veterinário', 'Banho e tosa']),
+    ('Impostos', 600, 0.9, 2, ['DAS', 'IPVA', 'Imposto de renda', 'Licenciamento']),
+]
+
+REVENUE_PROFILES = [
+    ('Salário', 4800, 0.15, 30, ['Salário', 'Adiantamento salarial']),
+    ('Freelance', 1200, 0.8, 8, ['Projeto freelance', 'Consultoria', 'Serviço avulso']),
+    ('Rendimentos', 85, 1.0, 6, ['Rendimento CDB', 'Dividendos', 'Juros da poupança', 'Tesouro Direto']),
+    ('Reembolsos', 140, 0.8, 4, ['Reembolso de despesas', 'Estorno', 'Cashback']),
+    ('Vendas', 250, 0.9, 3, ['Venda de usado', 'Venda online']),
+    ('Aluguel recebido', 1300, 0.3, 2, ['Aluguel do imóvel']),
+    ('Bônus', 2500, 0.6, 1, ['PLR', '13º salário', 'Bônus anual']),
+    ('Presentes', 200, 0.8, 1, ['Presente', 'Pix recebido']),
+]
+
+WALLET_NAMES = ['Conta corrente', 'Poupança', 'Carteira', 'Conta digital', 'Investimentos', 'Conta conjunta']
+
+# Recorrências típicas: (tipo, categoria, descrição, frequência)
+RECURRENT_TEMPLATES = [
+    ('expense', 'Moradia', 'Aluguel', 'monthly'),
+    ('revenue', 'Salário', 'Salário', 'monthly'),
+    ('expense', 'Contas da casa', 'Internet fibra', 'monthly'),
+    ('expense', 'Assinaturas', 'Streaming de vídeo', 'monthly'),
+    ('expense', 'Assinaturas', 'Academia', 'monthly'),
+    ('expense', 'Impostos', 'IPVA', 'yearly'),
+    ('expense', 'Mercado', 'Feira livre', 'weekly'),
+    ('revenue', 'Rendimentos', 'Rendimento CDB', 'monthly'),
+]
+
+
+@dataclass
+class SeedOptions:
+    users: int = 10
+    wallets: int = 3
+    revenue_categories: int = 6
+    expense_categories: int = 10
+    revenues: int = 600
+    expenses: int = 2400
+    recurrent: int = 5
+    transfers: int = 50
+    years: int = 3
+    forward_days: int = 120
+    seed: int = 42
+    anchor: date = None
+    prefix: str = 'seed'
+    password: str = 'seed1234'
+
+
+def _categories(profiles, count):
+    """As count categorias mais frequentes; acima do catálogo, categorias genéricas extras."""
+    chosen = list(profiles[:count])
+    for n in range(len(chosen), count):
+        chosen.append((f'Outros {n - len(profiles) + 1}', 100, 0.9, 1, ['Diversos']))
+    return chosen
+
+
+def _amount(rng, median, sigma, scale=1.0):
+    """Valor log-normal em reais (float com 2 casas; a coluna Numeric do SQLite grava como REAL)."""
+    return round(min(max(rng.lognormvariate(math.log(median * scale), sigma), 1.0), MAX_AMOUNT), 2)
+
+
+def _settlement(rng, due, anchor):
+    """(liquidado, data de liquidação): quase tudo vencido está pago; uma parte do futuro foi antecipada."""
+    if due <= anchor:
+        if rng.random() < 0.93 or (anchor - due).days > 90:
+            day = min(due + timedelta(days=int(rng.random() * 9) - 3), anchor)
+        else:
+            return False, None
+    elif rng.random() < 0.08:
+        day = anchor - timedelta(days=int(rng.random() * 11))
+    else:
+        return False, None
+    minutes = 420 + int(rng.random() * 960)
+    return True, datetime(day.year, day.month, day.day, minutes // 60, minutes % 60)
+
+
+class SeedBuffer:
+    """Acumula linhas por tabela e as grava em executemany de SEED_CHUNK_SIZE linhas.
+
+    Usa o INSERT do Core na tabela (não o bulk insert do ORM): um executemany por lote, sem
+    objetos nem eventos de sessão, e portável entre os bancos aceitos em DATABASE_URL.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.rows = {}
+        self.counts = {}
+
+    def add(self, model, row):
+        rows = self.rows.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= SEED_CHUNK_SIZE:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for target in ([model] if model else list(self.rows)):
+            rows = self.rows.get(target)
+            if not rows:
+                continue
+            # Linhas com o mesmo conjunto de colunas vão no mesmo executemany
+            groups = {}
+            for row in rows:
+                groups.setdefault(tuple(row), []).append(row)
+            for group in groups.values():
+                self.session.execute(insert(target.__table__), group)
+            self.counts[target.__tablename__] = self.counts.get(target.__tablename__, 0) + len(rows)
+            self.rows[target] = []
+
+
+def _next_id(model):
+    return (db.session.scalar(db.select(func.max(model.id))) or 0) + 1
+
+
+def _transactions(rng, buffer, options, model, profiles, user_id, wallets, category_ids, count, scale):
+    settled_attr, settled_at_attr = ('is_received', 'receipt_date') if model is RevenueTransaction \
+        else ('is_paid', 'payment_date')
+    anchor = options.anchor
+    span = options.years * 365 + options.forward_days
+    first_day = anchor - timedelta(days=options.years * 365)
+    extra = {'type': 'R'} if model is RevenueTransaction else {}
+    # Laço quente: sorteios com random() direto (randint/choices custam várias chamadas por valor)
+    cumulative = list(accumulate(profile[3] for profile in profiles))
+    total_weight = cumulative[-1]
+    mus = [math.log(profile[1] * scale) for profile in profiles]
+    days = [timedelta(days=n) for n in range(span + 11)]
+    random, lognormvariate = rng.random, rng.lognormvariate
+
+    for _ in range(count):
+        index = bisect(cumulative, random() * total_weight)
+        descriptions = profiles[index][4]
+        due = first_day + days[int(random() * span)]
+        settled, settled_at = _settlement(rng, due, anchor)
+        amount = lognormvariate(mus[index], profiles[index][2])
+        buffer.add(model, {
+            'description': f'{descriptions[int(random() * len(descriptions))]} {due.month:02d}/{due.year}',
+            'amount': round(min(max(amount, 1.0), MAX_AMOUNT), 2),
+            'date': due - days[int(random() * 11)],
+            'due_date': due,
+            settled_attr: settled,
+            settled_at_attr: settled_at,
+            'is_recurrent': False,
+            'user_id': user_id,
+            'wallet_id': wallets[int(random() * len(wallets))],
+            'category_id': category_ids[index],
+            **extra,
+        })
+
+
+def _recurrent(rng, buffer, options, user_id, wallets, revenue_ids, expense_ids, scale):
+    anchor = options.anchor
+    catalog = {profile[0]: profile for profile in EXPENSE_PROFILES + REVENUE_PROFILES}
+    for n in range(options.recurrent):
+        kind, category, description, frequency = RECURRENT_TEMPLATES[n % len(RECURRENT_TEMPLATES)]
+        model, ids = (RevenueTransaction, revenue_ids) if kind == 'revenue' else (Expense, expense_ids)
+        _, median, sigma, _, _ = catalog[category]
+        due = anchor - timedelta(days=rng.randint(0, 28))
+        settled, settled_at = _settlement(rng, due, anchor)
+        row = {
+            'description': description,
+            'amount': _amount(rng, median, sigma / 2, scale),
+            'date': due,
+            'due_date': due,
+            'is_recurrent': True,
+            'frequency': frequency,
+            'next_run_at': next_occurrence(due, frequency, due),
+            'user_id': user_id,
+            'wallet_id': wallets[0],
+            # Categoria do template, ou a primeira do usuário se ela não estiver entre as geradas
+            'category_id': ids.get(category, next(iter(ids.values()))),
+        }
+        if model is RevenueTransaction:
+            row.update(type='R', is_received=settled, receipt_date=settled_at)
+        else:
+            row.update(is_paid=settled, payment_date=settled_at)
+        buffer.add(model, row)
+
+
+def seed(options, progress=None):
+    """Gera options.users usuários com carteiras, categorias, lançamentos, recorrências e transferências.
+
+    Mesma semente e mesmas opções (inclusive anchor) produzem exatamente os mesmos dados.
+    Retorna {tabela: linhas inseridas}.
+    """
+    options.anchor = options.anchor or date.today()
+    rng = random.Random(options.seed)
+    session = db.session
+    buffer = SeedBuffer(session)
+
+    emails = [f'{options.prefix}{n:05d}@example.com' for n in range(1, options.users + 1)]
+    existing = session.scalar(db.select(func.count(User.id)).where(User.email.in_(emails[:1000])))
+    if existing:
+        raise ValueError(f'Já existem usuários com o prefixo "{options.prefix}"; use outro --prefix ou um banco vazio.')
+
+    password_hash = generate_password_hash(options.password)
+    user_id, wallet_id = _next_id(User), _next_id(Wallet)
+    revenue_category_id, expense_category_id = _next_id(RevenueCategory), _next_id(ExpenseCategory)
+    revenue_profiles = _categories(REVENUE_PROFILES, options.revenue_categories)
+    expense_profiles = _categories(EXPENSE_PROFILES, options.expense_categories)
+
+    # Os triggers do FTS são desligados durante a carga e o índice é reconstruído de uma vez no final
+    with search_index_suspended():
+        for n, email in enumerate(emails, start=1):
+            # Nível de renda do usuário: escala todos os valores (log-normal em torno de 1)
+            scale = rng.lognormvariate(0, 0.5)
+            buffer.add(User, {
+                'id': user_id, 'username': email.split('@')[0], 'email': email, 'password_hash': password_hash,
+                'created_at': datetime.combine(options.anchor - timedelta(days=options.years * 365), time(9)),
+                'is_admin': False, 'access_due_date': options.anchor + timedelta(days=365),
+            })
+
+            wallets = list(range(wallet_id, wallet_id + options.wallets))
+            initial = {wid: Decimal(str(_amount(rng, 2000, 1.0, scale))) for wid in wallets}
+            for _ in range(options.transfers if len(wallets) > 1 else 0):
+                source, target = rng.sample(wallets, 2)
+                amount = Decimal(str(_amount(rng, 500, 0.8, scale)))
+                # Como na rota de transferência: o valor sai do saldo inicial da origem e entra no do destino
+                initial[source] -= amount
+                initial[target] += amount
+                moment = datetime.combine(options.anchor - timedelta(days=rng.randrange(options.years * 365)),
+                                          time(rng.randint(7, 22), rng.randint(0, 59)))
+                buffer.add(Transfer, {'amount': amount, 'date': moment, 'source_wallet_id': source,
+                                      'target_wallet_id': target, 'user_id': user_id})
+            for index, wid in enumerate(wallets):
+                name = WALLET_NAMES[index % len(WALLET_NAMES)]
+                if index >= len(WALLET_NAMES):
+                    name = f'{name} {index // len(WALLET_NAMES) + 1}'
+                buffer.add(Wallet, {'id': wid, 'name': name, 'initial_balance': initial[wid],
+                                    'balance': initial[wid], 'user_id': user_id})
+
+            revenue_ids, expense_ids = {}, {}
+            for profile in revenue_profiles:
+                buffer.add(RevenueCategory, {'id': revenue_category_id, 'name': profile[0], 'type': 'R', 'user_id': user_id})
+                revenue_ids[profile[0]] = revenue_category_id
+                revenue_category_id += 1
+            for profile in expense_profiles:
+                buffer.add(ExpenseCategory, {'id': expense_category_id, 'name': profile[0], 'user_id': user_id})
+                expense_ids[profile[0]] = expense_category_id
+                expense_category_id += 1
+
+            # Tabelas-pai antes dos lançamentos (chaves estrangeiras)
+            for model in (User, Wallet, RevenueCategory, ExpenseCategory):
+                buffer.flush(model)
+
+            _transactions(rng, buffer, options, RevenueTransaction, revenue_profiles, user_id, wallets,
+                          list(revenue_ids.values()), options.revenues, scale)
+            _transactions(rng, buffer, options, Expense, expense_profiles, user_id, wallets,
+                          list(expense_ids.values()), options.expenses, scale)
+            if options.recurrent:
+                _recurrent(rng, buffer, options, user_id, wallets, revenue_ids, expense_ids, scale)
+
+            user_id += 1
+            wallet_id += options.wallets
+            if progress:
+                progress(n)
+
+        buffer.flush()
+        session.commit()
+
+    # Estado derivado, recalculado de uma vez a partir dos lançamentos inseridos
+    rebuild_rollups()
+    reconcile_balances(fix=True)
+    refresh_due_today_counts()
+    return buffer.counts
@@ -1,74 +1,153 @@
 from app.extensions import db
-from .models import Expense
+from .models import Expense, RevenueTransaction
+from .recurrence import occurrences_between, next_occurrence
+from .ledger import SETTLEMENT, bulk_insert
+from app.auth.models import User
+from sqlalchemy import func, literal, union_all, update, bindparam
 from datetime import datetime, date
-from dateutil.relativedelta import relativedelta
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 
-def calculate_next_date(start_date, frequency):
-    if frequency == 'daily':
-        return start_date + relativedelta(days=1)
-    elif frequency == 'weekly':
-        return start_date + relativedelta(weeks=1)
-    elif frequency == 'monthly':
-        return start_date + relativedelta(months=1)
-    elif frequency == 'yearly':
-        return start_date + relativedelta(years=1)
-    
-    return start_date
-
-
-def process_recurrent_transactions():
-    logging.info("--- Iniciando verificação de despesas recorrentes ---")
-    
-    recurrent_expenses = Expense.query.filter_by(is_recurrent=True).all()
-    
-    today = datetime.utcnow().date()
-    new_expenses_count = 0
-
-    for template_tx in recurrent_expenses:
-        last_ref_date = template_tx.last_launch_date.date() if template_tx.last_launch_date else template_tx.due_date
-        frequency = template_tx.frequency
-        
-        current_date_to_check = last_ref_date
-        
-        while True:
-            next_launch_date = calculate_next_date(current_date_to_check, frequency)
-            
-            if next_launch_date <= today:
-                new_tx = Expense(
-                    description=template_tx.description,
-                    amount=template_tx.amount,
-                    
-                    date=date.today(),
-                    due_date=next_launch_date,
-                    is_paid=False,
-                    payment_date=None, 
-                    
-                    is_recurrent=False, 
-                    frequency=None,
-                    last_launch_date=None,
-
-                    user_id=template_tx.user_id,
-                    wallet_id=template_tx.wallet_id,
-                    item_id=template_tx.item_id,
-                )
-                
-                db.session.add(new_tx)
-                new_expenses_count += 1
-                
-                current_date_to_check = next_launch_date 
-            else:
-                break
-        
-        if current_date_to_check != last_ref_date:
-            template_tx.last_launch_date = datetime(current_date_to_check.year, current_date_to_check.month, current_date_to_check.day)
-
-    
-    if new_expenses_count > 0:
-        db.session.commit()
-        logging.info(f"--- Sucesso: Lançadas {new_expenses_count} novas despesas a pagar. ---")
-    else:
-        db.session.rollback()
-        logging.info("--- Nenhuma despesa recorrente para lançar hoje. ---")
+RECURRENT_MODELS = (Expense, RevenueTransaction)
+CHUNK_SIZE = 500
+
+# Colunas fixas dos lançamentos gerados, além das copiadas do template
+LAUNCH_DEFAULTS = {
+    RevenueTransaction: {'type': 'R'},
+}
+
+
+def _write_chunk(model, rows, schedule):
+    """Grava um lote de ocorrências e o novo agendamento dos templates na mesma transação."""
+    bulk_insert(db.session, model, rows)
+    if schedule:
+        db.session.execute(update(model), list(schedule.values()))
+    db.session.commit()
+
+
+def _schedule(template, last_launch, last_date):
+    return {
+        'id': template.id,
+        'last_launch_date': last_launch,
+        'next_run_at': next_occurrence(template.due_date, template.frequency, last_date),
+    }
+
+
+def _launch_model(model, today, chunk_size):
+    settled_attr, settled_at_attr, _, _ = SETTLEMENT[model]
+    templates = db.session.execute(
+        db.select(model.id, model.description, model.amount, model.due_date, model.frequency,
+                  model.last_launch_date, model.user_id, model.wallet_id, model.category_id)
+        .where(model.is_recurrent == True, model.next_run_at <= today)
+    ).all()
+
+    chunk, schedule = [], {}
+    launched_rows = 0
+    for template in templates:
+        last_launch = template.last_launch_date
+        last_date = last_launch.date() if last_launch else template.due_date
+
+        for due_date in occurrences_between(template.due_date, template.frequency, last_date, today):
+            chunk.append({
+                'description': template.description,
+                'amount': template.amount,
+                'date': today,
+                'due_date': due_date,
+                settled_attr: False,
+                settled_at_attr: None,
+                'is_recurrent': False,
+                'frequency': None,
+                'last_launch_date': None,
+                'next_run_at': None,
+                'user_id': template.user_id,
+                'wallet_id': template.wallet_id,
+                'category_id': template.category_id,
+                **LAUNCH_DEFAULTS.get(model, {}),
+            })
+            last_date = due_date
+            last_launch = datetime.combine(due_date, datetime.min.time())
+
+            if len(chunk) >= chunk_size:
+                schedule[template.id] = _schedule(template, last_launch, last_date)
+                _write_chunk(model, chunk, schedule)
+                launched_rows += len(chunk)
+                chunk, schedule = [], {}
+
+        schedule[template.id] = _schedule(template, last_launch, last_date)
+        if len(schedule) >= chunk_size:
+            _write_chunk(model, chunk, schedule)
+            launched_rows += len(chunk)
+            chunk, schedule = [], {}
+
+    if chunk or schedule:
+        _write_chunk(model, chunk, schedule)
+        launched_rows += len(chunk)
+
+    return len(templates), launched_rows
+
+
+def process_recurrent_transactions(today=None, chunk_size=CHUNK_SIZE):
+    """Lança as ocorrências vencidas dos templates recorrentes de receitas e despesas.
+
+    Só lê os templates com next_run_at vencido, então o custo acompanha o que há a lançar.
+    As ocorrências são gravadas com insert() em massa, em lotes de chunk_size com commit
+    por lote; saldos, rollups e notificações são atualizados pelo ledger.
+    """
+    logging.info("--- Iniciando verificação de lançamentos recorrentes ---")
+    today = today or date.today()
+    started = time.perf_counter()
+
+    templates_count = rows_count = 0
+    for model in RECURRENT_MODELS:
+        model_templates, model_rows = _launch_model(model, today, chunk_size)
+        templates_count += model_templates
+        rows_count += model_rows
+    db.session.rollback()
+
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    logging.info(
+        f"--- Recorrência: {templates_count} templates, {rows_count} lançamentos em {elapsed:.3f}s "
+        f"({templates_count / elapsed:.0f} templates/s, {rows_count / elapsed:.0f} lançamentos/s) ---"
+    )
+    return rows_count
+
+def refresh_due_today_counts(day=None, user_id=None):
+    """Recalcula as contagens de notificação (pendências vencendo no dia) com uma consulta agrupada.
+
+    Roda diariamente para todos os usuários; com user_id, recalcula só aquele usuário.
+    """
+    day = day or date.today()
+
+    revenues = db.select(RevenueTransaction.user_id, literal('revenue'), func.count()) \
+        .where(RevenueTransaction.is_received == False, RevenueTransaction.due_date == day) \
+        .group_by(RevenueTransaction.user_id)
+    expenses = db.select(Expense.user_id, literal('expense'), func.count()) \
+        .where(Expense.is_paid == False, Expense.due_date == day) \
+        .group_by(Expense.user_id)
+    if user_id is not None:
+        revenues = revenues.where(RevenueTransaction.user_id == user_id)
+        expenses = expenses.where(Expense.user_id == user_id)
+
+    counts = {}
+    for owner_id, kind, total in db.session.execute(union_all(revenues, expenses)):
+        counts.setdefault(owner_id, {'revenue': 0, 'expense': 0})[kind] = total
+
+    user_table = User.__table__
+    reset = update(user_table).values(notif_day=day, notif_revenue_today=0, notif_expense_today=0)
+    if user_id is not None:
+        reset = reset.where(user_table.c.id == user_id)
+    db.session.execute(reset)
+
+    if counts:
+        db.session.execute(
+            update(user_table)
+            .where(user_table.c.id == bindparam('owner_id'))
+            .values(notif_revenue_today=bindparam('revenue'), notif_expense_today=bindparam('expense')),
+            [{'owner_id': owner_id, **values} for owner_id, values in counts.items()]
+        )
+    db.session.commit()
+
+    if user_id is None:
+        logging.info(f"--- Notificações de {day}: {len(counts)} usuários com pendências vencendo hoje. ---")
@@ -1,10 +1,10 @@
 from flask import Blueprint, render_template, jsonify
 from flask_login import login_required, current_user
-from app.financeiro.models import Wallet, RevenueTransaction, Expense, RevenueCategory, ExpenseCategory
-from app.extensions import db
-from sqlalchemy import func, desc, asc, extract
+from app.financeiro.models import Wallet, RevenueTransaction, Expense, RevenueCategory, ExpenseCategory, MonthlyRollup
+from app.financeiro.tasks import refresh_due_today_counts
+from app.extensions import db, cache
+from sqlalchemy import func, desc, asc, and_, or_
 from datetime import datetime, timedelta, date
-from calendar import monthrange
 from config import Config
 from decimal import Decimal
 
@@ -12,68 +12,57 @@ main_bp = Blueprint('main', __name__, template_folder='templates')
 footer = {'ano': Config.ANO_ATUAL, 'versao': Config.VERSAO_APP}
 TRANSFER_CATEGORY_NAME = 'Transferência'
 
+def month_index(value):
+    """Índice absoluto do mês (ano * 12 + mês - 1), usado como chave dos buckets."""
+    return value.year * 12 + value.month - 1
+
+def month_start(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+def get_monthly_buckets(user_id, first_month, current_month, last_month):
+    """Totais mensais de receitas e despesas lidos do monthly_rollup em uma única consulta.
+
+    Meses até o atual usam o rollup realizado (data de recebimento/pagamento); meses
+    futuros usam o previsto (vencimento). Retorna {(kind, índice_do_mês): total}.
+    """
+    rows = db.session.execute(
+        db.select(MonthlyRollup.kind, MonthlyRollup.month, func.sum(MonthlyRollup.total)).where(
+            MonthlyRollup.user_id == user_id,
+            or_(
+                and_(MonthlyRollup.basis == 'realized',
+                     MonthlyRollup.month >= month_start(first_month),
+                     MonthlyRollup.month < month_start(current_month + 1)),
+                and_(MonthlyRollup.basis == 'projected',
+                     MonthlyRollup.month >= month_start(current_month + 1),
+                     MonthlyRollup.month < month_start(last_month + 1))
+            )
+        ).group_by(MonthlyRollup.kind, MonthlyRollup.month)
+    ).all()
+
+    return {(kind, month_index(month)): total for kind, month, total in rows}
+
 def get_monthly_data(user_id, months_back=5, months_forward=6):
     today = date.today()
+    current_month = month_index(today)
+    first_month = current_month - months_back
+    last_month = current_month + months_forward
+
+    buckets = get_monthly_buckets(user_id, first_month, current_month, last_month)
+
     labels = []
     revenues = []
     expenses = []
     balances = []
-    
-    start_range = -months_back
-    end_range = months_forward + 1
-    
-    current_balance_accumulated = 0
-
-    for i in range(start_range, end_range):
-        target_month = today.month + i
-        target_year = today.year
-        
-        while target_month > 12:
-            target_month -= 12
-            target_year += 1
-        while target_month < 1:
-            target_month += 12
-            target_year -= 1
-            
-        month_name = date(target_year, target_month, 1).strftime('%b/%y')
-        labels.append(month_name)
-        
-        _, last_day = monthrange(target_year, target_month)
-        m_start = date(target_year, target_month, 1)
-        m_end = date(target_year, target_month, last_day)
-        
-        if i <= 0:
-            rev_sum = db.session.query(func.sum(RevenueTransaction.amount)).filter(
-                RevenueTransaction.user_id == user_id,
-                RevenueTransaction.is_received == True,
-                RevenueTransaction.receipt_date >= m_start,
-                RevenueTransaction.receipt_date <= m_end
-            ).scalar() or 0
-            
-            exp_sum = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == user_id,
-                Expense.is_paid == True,
-                Expense.payment_date >= m_start,
-                Expense.payment_date <= m_end
-            ).scalar() or 0
-        else:
-            rev_sum = db.session.query(func.sum(RevenueTransaction.amount)).filter(
-                RevenueTransaction.user_id == user_id,
-                RevenueTransaction.due_date >= m_start,
-                RevenueTransaction.due_date <= m_end
-            ).scalar() or 0
-            
-            exp_sum = db.session.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == user_id,
-                Expense.due_date >= m_start,
-                Expense.due_date <= m_end
-            ).scalar() or 0
-
-        revenues.append(float(rev_sum))
-        expenses.append(float(exp_sum))
-        
-        net_result = float(rev_sum) - float(exp_sum)
-        balances.append(net_result)
+
+    for index in range(first_month, last_month + 1):
+        labels.append(month_start(index).strftime('%b/%y'))
+
+        rev_sum = float(buckets.get(('revenue', index)) or 0)
+        exp_sum = float(buckets.get(('expense', index)) or 0)
+
+        revenues.append(rev_sum)
+        expenses.append(exp_sum)
+        balances.append(rev_sum - exp_sum)
 
     return {
         'labels': labels,
@@ -85,24 +74,28 @@ def get_monthly_data(user_id, months_back=5, months_forward=6):
 def get_category_data(user_id):
     """Agrupa despesas e receitas por categoria (Referente ao ano atual para ter relevância)"""
     current_year = date.today().year
+    year_filter = and_(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.basis == 'projected',
+        MonthlyRollup.month >= date(current_year, 1, 1),
+        MonthlyRollup.month < date(current_year + 1, 1, 1)
+    )
     
-    # 1. Agrupar Despesas por Categoria
+    # 1. Agrupar Despesas por Categoria (a partir do rollup mensal)
     expenses_query = db.session.query(
         ExpenseCategory.name,
-        func.sum(Expense.amount)
-    ).join(Expense).filter(
-        Expense.user_id == user_id,
-        extract('year', Expense.due_date) == current_year
-    ).group_by(ExpenseCategory.name).all()
+        func.sum(MonthlyRollup.total)
+    ).join(MonthlyRollup, and_(
+        MonthlyRollup.category_id == ExpenseCategory.id, MonthlyRollup.kind == 'expense'
+    )).filter(year_filter).group_by(ExpenseCategory.name).all()
     
     # 2. Agrupar Receitas por Categoria
     revenues_query = db.session.query(
         RevenueCategory.name,
-        func.sum(RevenueTransaction.amount)
-    ).join(RevenueTransaction).filter(
-        RevenueTransaction.user_id == user_id,
-        extract('year', RevenueTransaction.due_date) == current_year
-    ).group_by(RevenueCategory.name).all()
+        func.sum(MonthlyRollup.total)
+    ).join(MonthlyRollup, and_(
+        MonthlyRollup.category_id == RevenueCategory.id, MonthlyRollup.kind == 'revenue'
+    )).filter(year_filter).group_by(RevenueCategory.name).all()
     
     return {
         'expense_labels': [e[0] for e in expenses_query],
@@ -111,58 +104,70 @@ def get_category_data(user_id):
         'revenue_values': [float(r[1]) for r in revenues_query]
     }
 
-@main_bp.route('/')
-@login_required
-def index():
-    # 1. Totais Gerais (Mantido)
-    total_revenues = db.session.query(func.sum(RevenueTransaction.amount)).filter_by(user_id=current_user.id, is_received=True).scalar() or 0
-    total_expenses = db.session.query(func.sum(Expense.amount)).filter_by(user_id=current_user.id, is_paid=True).scalar() or 0
-    balance = total_revenues - total_expenses
+def get_dashboard_payload(user_id):
+    """Monta os dados do dashboard apenas com tipos simples, para poderem ir ao cache."""
+    # 1. Totais Gerais (uma única consulta agrupada por carteira)
+    wallet_balances = Wallet.balances_for_user(user_id).values()
+    total_revenues = sum((b['received'] for b in wallet_balances), Decimal(0))
+    total_expenses = sum((b['paid'] for b in wallet_balances), Decimal(0))
     
-    # 2. Gráfico de Fluxo (Mantido)
-    chart_data = get_monthly_data(current_user.id)
+    # 2. Listas "Próximos 5" (já com o nome da categoria, sem lazy load no template)
+    next_expenses = db.session.execute(
+        db.select(Expense.description, Expense.amount, Expense.due_date, ExpenseCategory.name.label('category_name'))
+        .join(ExpenseCategory, Expense.category_id == ExpenseCategory.id)
+        .where(Expense.user_id == user_id, Expense.is_paid == False)
+        .order_by(asc(Expense.due_date)).limit(5)
+    ).mappings().all()
     
-    # 3. NOVOS DADOS: Gráficos de Categoria (Ano Atual)
-    category_data = get_category_data(current_user.id)
+    next_revenues = db.session.execute(
+        db.select(RevenueTransaction.description, RevenueTransaction.amount, RevenueTransaction.due_date, RevenueCategory.name.label('category_name'))
+        .join(RevenueCategory, RevenueTransaction.category_id == RevenueCategory.id)
+        .where(RevenueTransaction.user_id == user_id, RevenueTransaction.is_received == False)
+        .order_by(asc(RevenueTransaction.due_date)).limit(5)
+    ).mappings().all()
     
-    # 4. NOVOS DADOS: Listas "Próximos 5"
-    next_expenses = Expense.query.filter_by(
-        user_id=current_user.id, 
-        is_paid=False
-    ).order_by(asc(Expense.due_date)).limit(5).all()
+    return {
+        'total_revenues': total_revenues,
+        'total_expenses': total_expenses,
+        'balance': total_revenues - total_expenses,
+        # 3. Gráfico de Fluxo
+        'chart_data': get_monthly_data(user_id),
+        # 4. Gráficos de Categoria (Ano Atual)
+        'category_data': get_category_data(user_id),
+        'next_expenses': [dict(row) for row in next_expenses],
+        'next_revenues': [dict(row) for row in next_revenues],
+    }
+
+@main_bp.route('/')
+@login_required
+def index():
+    today = date.today()
     
-    next_revenues = RevenueTransaction.query.filter_by(
-        user_id=current_user.id, 
-        is_received=False
-    ).order_by(asc(RevenueTransaction.due_date)).limit(5).all()
+    # A versão muda a cada escrita financeira do usuário, então a chave antiga simplesmente deixa de ser usada
+    cache_key = ('dashboard', current_user.id, current_user.data_version, today.isoformat())
+    payload = cache.get_or_set(cache_key, lambda: get_dashboard_payload(current_user.id))
     
     return render_template('main/dashboard.html', 
                            title='Dashboard',
-                           total_revenues=total_revenues,
-                           total_expenses=total_expenses,
-                           balance=balance,
-                           chart_data=chart_data,
-                           category_data=category_data,
-                           next_expenses=next_expenses,
-                           next_revenues=next_revenues,
-                           now_date=date.today()) # <--- ADICIONADO AQUI: Passando a data de hoje
+                           now_date=today, # <--- ADICIONADO AQUI: Passando a data de hoje
+                           **payload)
+
+@main_bp.before_app_request
+def refresh_notifications():
+    # Contagens pré-calculadas no usuário (job diário + ledger); só recalcula se o job
+    # ainda não rodou hoje para este usuário. Fica antes da view, e não no context processor,
+    # porque o recálculo faz commit e não pode gravar o que a requisição tiver pendente.
+    today = date.today()
+    if current_user.is_authenticated and current_user.notif_day != today:
+        refresh_due_today_counts(today, user_id=current_user.id)
 
 @main_bp.app_context_processor
 def inject_notifications():
     if not current_user.is_authenticated:
         return dict()
-        
-    today = date.today()
-    
-    rev_count = RevenueTransaction.query.filter_by(
-        user_id=current_user.id, is_received=False, due_date=today
-    ).count()
-    
-    exp_count = Expense.query.filter_by(
-        user_id=current_user.id, is_paid=False, due_date=today
-    ).count()
-    
-    return dict(notif_revenue_today=rev_count, notif_expense_today=exp_count)
+
+    return dict(notif_revenue_today=current_user.notif_revenue_today,
+                notif_expense_today=current_user.notif_expense_today)
 
 @main_bp.route('/clear_broadcast', methods=['POST'])
 @login_required
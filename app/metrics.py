@@ -0,0 +1,305 @@
+import os
+import hmac
+import json
+import time
+import atexit
+import threading
+from bisect import bisect_left
+
+from flask import g, request, abort, Response
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        registry.register(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self.registry.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def set_total(self, value, *labelvalues):
+        """Define o total acumulado (para contadores lidos de outra fonte por um coletor)."""
+        with self.registry.lock:
+            self.values[labelvalues] = value
+
+    def dump(self):
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def samples(self, labels, value):
+        yield self.name, labels, value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # rótulos -> [contagem por faixa (não cumulativa)..., +Inf, soma]
+        self.values = {}
+        registry.register(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            state = self.values.get(labelvalues)
+            if state is None:
+                state = self.values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def dump(self):
+        return [[list(labels), list(state)] for labels, state in self.values.items()]
+
+    @staticmethod
+    def merge(total, state):
+        return [a + b for a, b in zip(total, state)] if total else list(state)
+
+    def samples(self, labels, state):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+            cumulative += count
+            yield f'{self.name}_bucket', labels + (('le', _format_value(bound)),), cumulative
+        yield f'{self.name}_sum', labels, state[-1]
+        yield f'{self.name}_count', labels, cumulative
+
+
+class MetricsRegistry:
+    """Métricas do processo, protegidas por um lock; com directory, agregadas entre processos.
+
+    No modo multiprocesso cada processo grava periodicamente um snapshot (metrics-<pid>.json)
+    no diretório compartilhado e a exposição soma os snapshots de todos. Arquivos de processos
+    encerrados continuam somando, como contadores devem: limpe o diretório a cada deploy.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = {}
+        self.directory = None
+        self.flush_interval = 5
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def collector(self, fn):
+        """Registra fn(), chamada antes de cada snapshot/exposição para atualizar métricas lidas de fora.
+
+        Coletores com o mesmo nome se substituem (create_app chamado de novo não os duplica).
+        """
+        self.collectors[fn.__name__] = fn
+        return fn
+
+    def _collect(self):
+        for fn in list(self.collectors.values()):
+            fn()
+
+    def snapshot(self):
+        self._collect()
+        with self.lock:
+            return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        """Grava o snapshot deste processo no diretório compartilhado (escrita atômica)."""
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, path)
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def aggregate(self):
+        """{nome: {rótulos: valor}} somando todos os processos (ou só este, sem diretório)."""
+        if self.directory:
+            self.flush()
+            snapshots = []
+            for name in os.listdir(self.directory):
+                if name.startswith('metrics-') and name.endswith('.json'):
+                    try:
+                        with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                            snapshots.append(json.load(f))
+                    except (OSError, ValueError):
+                        continue
+        else:
+            snapshots = [self.snapshot()]
+
+        merged = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, entries in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for labels, value in entries:
+                    key = tuple(labels)
+                    merged[name][key] = metric.merge(merged[name].get(key), value)
+        return merged
+
+    def exposition(self):
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        lines = []
+        for name, values in self.aggregate().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labelvalues, value in sorted(values.items()):
+                labels = tuple(zip(metric.labelnames, labelvalues))
+                for sample, sample_labels, sample_value in metric.samples(labels, value):
+                    lines.append(f'{sample}{_format_labels(sample_labels)} {_format_value(sample_value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+
+http_requests = Counter(REGISTRY, 'http_requests_total', 'Requisições HTTP atendidas.',
+                        ('blueprint', 'endpoint', 'method', 'status'))
+http_duration = Histogram(REGISTRY, 'http_request_duration_seconds', 'Latência das requisições HTTP.',
+                          ('blueprint', 'endpoint'), REQUEST_BUCKETS)
+db_statements = Counter(REGISTRY, 'db_statements_total', 'Statements SQL executados em requisições.',
+                        ('blueprint', 'endpoint'))
+db_duration = Counter(REGISTRY, 'db_duration_seconds_total', 'Tempo gasto em statements SQL nas requisições.',
+                      ('blueprint', 'endpoint'))
+db_statements_per_request = Histogram(REGISTRY, 'db_statements_per_request', 'Statements SQL por requisição.',
+                                      ('blueprint', 'endpoint'), STATEMENT_BUCKETS)
+pool_wait = Histogram(REGISTRY, 'db_pool_checkout_wait_seconds', 'Espera para obter uma conexão do pool.',
+                      (), POOL_WAIT_BUCKETS)
+job_duration = Histogram(REGISTRY, 'scheduler_job_duration_seconds', 'Duração das execuções dos jobs agendados.',
+                         ('job', 'status'), JOB_BUCKETS)
+job_rows = Counter(REGISTRY, 'scheduler_job_rows_total', 'Linhas geradas pelos jobs agendados.', ('job',))
+cache_requests = Counter(REGISTRY, 'cache_requests_total', 'Consultas ao cache de payloads, por resultado.',
+                         ('result',))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mede, em db_pool_checkout_wait_seconds, quanto cada checkout esperou."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - started)
+
+
+def observe_job(job_id, duration, status, rows=None):
+    """Registra uma execução de job agendado (chamado pelo app.scheduling)."""
+    job_duration.observe(duration, job_id, status)
+    if rows:
+        job_rows.inc(job_id, amount=rows)
+
+
+class Metrics:
+    """Métricas no formato do Prometheus em /metrics (token em METRICS_TOKEN ou admin logado).
+
+    Deve ser inicializada antes do db.init_app, para trocar a classe do pool de conexões.
+    O custo por requisição é um perf_counter e algumas somas sob lock no after_request.
+    """
+
+    def __init__(self, app=None):
+        self.registry = REGISTRY
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+
+        directory = app.config.get('METRICS_DIR')
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            if self.registry.directory is None:
+                atexit.register(self.registry.flush)
+            self.registry.directory = directory
+            self.registry.flush_interval = app.config.get('METRICS_FLUSH_SECONDS', 5)
+
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        in_memory = url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+        if 'poolclass' not in options and not in_memory:
+            options['poolclass'] = TimedQueuePool
+
+        @self.registry.collector
+        def collect_cache():
+            versioned_cache = app.extensions.get('versioned_cache')
+            if versioned_cache is not None:
+                cache_requests.set_total(versioned_cache.hits, 'hit')
+                cache_requests.set_total(versioned_cache.misses, 'miss')
+
+        @app.before_request
+        def start_metrics():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def record_metrics(response):
+            started = g.pop('metrics_started', None)
+            if started is None:
+                return response
+            blueprint = request.blueprint or ''
+            endpoint = request.endpoint or 'none'
+            http_requests.inc(blueprint, endpoint, request.method, str(response.status_code))
+            http_duration.observe(time.perf_counter() - started, blueprint, endpoint)
+
+            stats = app.extensions['query_stats'].current() if 'query_stats' in app.extensions else None
+            if stats is not None:
+                db_statements.inc(blueprint, endpoint, amount=stats.count)
+                db_duration.inc(blueprint, endpoint, amount=stats.db_time)
+                db_statements_per_request.observe(stats.count, blueprint, endpoint)
+
+            self.registry.maybe_flush()
+            return response
+
+        token = app.config.get('METRICS_TOKEN')
+
+        def metrics_view():
+            from flask_login import current_user
+
+            authorization = request.headers.get('Authorization', '')
+            has_token = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+            if not has_token and not (current_user.is_authenticated and current_user.is_admin):
+                abort(403)
+            return Response(self.registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+from uuid import uuid4
+
+from flask import g, request
+
+
+class StackSampler(threading.Thread):
+    """Amostra a pilha de uma thread a cada interval segundos e conta as pilhas (formato collapsed)."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class RequestProfiler:
+    """Profiler sob demanda de uma requisição, ativado por administradores.
+
+    Com ?_profile=1 (ou o header X-Profile: 1) a requisição roda sob o cProfile e um amostrador
+    de pilhas; o resultado vai para PROFILER_DIR como <id>.prof (pstats/snakeviz) e
+    <id>.collapsed (flamegraph.pl, speedscope). Sem o parâmetro, o custo é só essa verificação.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['profiler'] = self
+        if not app.config.get('PROFILER_ENABLED', True):
+            return
+
+        self.directory = app.config.get('PROFILER_DIR')
+        self.interval = app.config.get('PROFILER_INTERVAL_MS', 5) / 1000
+        self.max_files = app.config.get('PROFILER_MAX_FILES', 50)
+
+        @app.before_request
+        def start_profiler():
+            if '_profile' not in request.args and 'X-Profile' not in request.headers:
+                return
+
+            from flask_login import current_user
+            if not (current_user.is_authenticated and current_user.is_admin):
+                return
+
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Outro profiler já ativo neste processo
+                return
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            sampler.start()
+            g.request_profile = (profile, sampler, time.perf_counter())
+
+        @app.after_request
+        def stop_profiler(response):
+            profile_id = self._finish()
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+            return response
+
+        @app.teardown_request
+        def discard_profiler(exc):
+            # Requisição que terminou em exceção não passa pelo after_request
+            self._finish()
+
+    def _finish(self):
+        running = g.pop('request_profile', None)
+        if running is None:
+            return None
+
+        profile, sampler, started = running
+        profile.disable()
+        sampler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        endpoint = (request.endpoint or 'unknown').replace('.', '-')
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{endpoint}_{uuid4().hex[:6]}"
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        with open(os.path.join(self.directory, f'{profile_id}.collapsed'), 'w', encoding='utf-8') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+        from flask import current_app
+        current_app.logger.info(f'Profile {profile_id}: {request.method} {request.full_path} em {elapsed_ms:.0f}ms')
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        """Mantém só os PROFILER_MAX_FILES perfis mais recentes."""
+        ids = self.list_ids()
+        for profile_id in ids[self.max_files:]:
+            for ext in ('prof', 'collapsed'):
+                try:
+                    os.remove(os.path.join(self.directory, f'{profile_id}.{ext}'))
+                except FileNotFoundError:
+                    pass
+
+    def list_ids(self):
+        """Ids dos perfis gravados, do mais recente para o mais antigo."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return sorted({name.rsplit('.', 1)[0] for name in os.listdir(self.directory)
+                       if name.endswith(('.prof', '.collapsed'))}, reverse=True)
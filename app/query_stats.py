@@ -0,0 +1,144 @@
+import re
+import json
+import time
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Listas de parâmetros expandidas (IN (?, ?, ?)) contam como o mesmo formato de consulta
+_PARAM_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """Formato normalizado de um statement: espaços e listas de parâmetros colapsados."""
+    return _PARAM_LIST.sub('(?)', _SPACES.sub(' ', statement).strip())
+
+
+class RequestQueries:
+    """Consultas SQL de uma requisição: contagem, tempo total e agregação por formato."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes = {}  # formato -> [execuções, tempo total, maior tempo]
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.db_time += duration
+        shape = self.shapes.setdefault(statement_shape(statement), [0, 0.0, 0.0])
+        shape[0] += 1
+        shape[1] += duration
+        shape[2] = max(shape[2], duration)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def slowest(self, limit=5):
+        """Formatos com a execução individual mais lenta: [(statement, maior tempo, execuções)]."""
+        ranked = sorted(self.shapes.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [(shape, slowest, count) for shape, (count, total, slowest) in ranked]
+
+    def repeated(self, threshold):
+        """Formatos executados threshold vezes ou mais (suspeita de N+1): [(statement, execuções, tempo total)]."""
+        return sorted(
+            ((shape, count, total) for shape, (count, total, slowest) in self.shapes.items() if count >= threshold),
+            key=lambda item: item[1], reverse=True,
+        )
+
+
+class QueryStats:
+    """Instrumentação por requisição sobre os eventos de execução do SQLAlchemy.
+
+    Expõe o resultado no header Server-Timing, em uma linha de log JSON por requisição e,
+    para administradores, no painel de depuração do layout (base/components/query_stats.html).
+    """
+
+    def __init__(self, app=None):
+        self.slowest_limit = 5
+        self.threshold = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['query_stats'] = self
+        if not app.config.get('QUERY_STATS_ENABLED', True):
+            return
+
+        self.slowest_limit = app.config.get('QUERY_STATS_SLOWEST', 5)
+        self.threshold = app.config.get('QUERY_STATS_NPLUSONE_THRESHOLD', 5)
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        @app.before_request
+        def start_query_stats():
+            g.query_stats = RequestQueries()
+
+        @app.after_request
+        def report_query_stats(response):
+            # g.get (não pop): outros after_request, como o das métricas, também leem a requisição
+            stats = g.get('query_stats')
+            if stats is None or request.endpoint == 'static':
+                return response
+
+            elapsed = stats.elapsed
+            response.headers.add('Server-Timing', f'db;dur={stats.db_time * 1000:.1f};desc="{stats.count} queries"')
+            response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+
+            repeated = stats.repeated(self.threshold)
+            line = json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'queries': stats.count,
+                'db_ms': round(stats.db_time * 1000, 1),
+                'n_plus_one': [{'statement': shape[:200], 'count': count} for shape, count, total in repeated],
+            }, ensure_ascii=False)
+            if repeated:
+                app.logger.warning(f'Consultas repetidas (N+1?) {line}')
+            else:
+                app.logger.info(f'Requisição {line}')
+            return response
+
+        @app.context_processor
+        def inject_query_stats():
+            return dict(query_stats=self.snapshot)
+
+    def current(self):
+        """Estatísticas da requisição em andamento (None fora de requisição ou desativado)."""
+        return g.get('query_stats') if has_request_context() else None
+
+    def snapshot(self):
+        """Resumo para o painel de depuração, com o que foi executado até o momento da chamada."""
+        stats = self.current()
+        if stats is None:
+            return None
+        return {
+            'count': stats.count,
+            'db_ms': stats.db_time * 1000,
+            'elapsed_ms': stats.elapsed * 1000,
+            'slowest': [(shape, slowest * 1000, count) for shape, slowest, count in stats.slowest(self.slowest_limit)],
+            'repeated': [(shape, count, total * 1000) for shape, count, total in stats.repeated(self.threshold)],
+            'threshold': self.threshold,
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_stats_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_stats_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    stats = g.get('query_stats') if has_request_context() else None
+    if stats is not None:
+        stats.record(statement, duration)
@@ -0,0 +1,206 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from uuid import uuid4
+
+import click
+from flask import g
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from sqlalchemy import update, insert, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .extensions import db, scheduler
+from .metrics import observe_job
+
+LEASE_NAME = 'scheduler'
+HOLDER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}'
+
+# job_id -> (início, duração, linhas geradas) da execução em andamento neste processo; lido pelo listener
+_pending_runs = {}
+_pending_lock = threading.Lock()
+_is_leader = False
+
+
+class SchedulerLease(db.Model):
+    """Lease do líder do agendador: só o processo que detém o lease válido executa os jobs."""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} | {self.holder} até {self.expires_at}>'
+
+
+class ScheduledJobRun(db.Model):
+    """Última execução de cada job agendado, com duração e atraso em relação ao horário previsto."""
+    job_id = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(120), nullable=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_duration_ms = db.Column(db.Integer, nullable=True)
+    last_lag_ms = db.Column(db.Integer, nullable=True)
+    last_status = db.Column(db.String(10), nullable=True)
+    run_count = db.Column(db.Integer, default=0, nullable=False)
+    error_count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<ScheduledJobRun {self.job_id} | {self.last_status}>'
+
+
+def acquire_lease(holder=HOLDER_ID, seconds=None):
+    """Obtém ou renova o lease do agendador. Retorna True se este processo é o líder.
+
+    O lease só troca de dono quando expira, então um líder que morre é substituído
+    automaticamente depois de SCHEDULER_LEASE_SECONDS.
+    """
+    from flask import current_app
+
+    seconds = seconds or current_app.config.get('SCHEDULER_LEASE_SECONDS', 90)
+    now = datetime.utcnow()
+    lease = SchedulerLease.__table__
+    values = dict(holder=holder, expires_at=now + timedelta(seconds=seconds))
+
+    try:
+        result = db.session.execute(
+            update(lease)
+            .where(lease.c.name == LEASE_NAME, or_(lease.c.holder == holder, lease.c.expires_at < now))
+            .values(**values)
+        )
+        if result.rowcount == 0:
+            # Sem lease gravado ainda; se outro processo já o detém, o INSERT viola a PK
+            db.session.execute(insert(lease).values(name=LEASE_NAME, **values))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _set_leader(app, leader):
+    global _is_leader
+    if leader != _is_leader:
+        app.logger.info(f"Agendador: {HOLDER_ID} {'assumiu' if leader else 'deixou'} a liderança")
+    _is_leader = leader
+
+
+def leader_task(app, trigger, id, **trigger_args):
+    """Registra um job no agendador que só executa no processo líder.
+
+    Se func retornar um inteiro (linhas geradas), ele entra em scheduler_job_rows_total.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            with app.app_context():
+                leader = acquire_lease()
+                _set_leader(app, leader)
+                if not leader:
+                    return
+
+                # Origem dos statements deste job no log de consultas lentas
+                g.query_origin = f'job:{id}'
+                started = datetime.now(timezone.utc)
+                clock = time.perf_counter()
+                rows = None
+                try:
+                    rows = func()
+                finally:
+                    db.session.rollback()
+                    with _pending_lock:
+                        _pending_runs[id] = (started, time.perf_counter() - clock, rows)
+
+        scheduler.task(trigger, id=id, **trigger_args)(wrapper)
+        return wrapper
+    return decorator
+
+
+def _record_run(app, event):
+    with _pending_lock:
+        run = _pending_runs.pop(event.job_id, None)
+    if run is None:
+        return
+
+    started, duration, rows = run
+    lag = (started - event.scheduled_run_time).total_seconds() if event.scheduled_run_time else 0
+    status = 'error' if event.exception else 'ok'
+    observe_job(event.job_id, duration, status, rows if isinstance(rows, int) else None)
+    app.logger.info(f"Job {event.job_id}: {status} em {duration * 1000:.0f}ms (atraso {lag * 1000:.0f}ms)")
+
+    with app.app_context():
+        try:
+            record = db.session.get(ScheduledJobRun, event.job_id)
+            if record is None:
+                record = ScheduledJobRun(job_id=event.job_id, run_count=0, error_count=0)
+                db.session.add(record)
+            record.holder = HOLDER_ID
+            record.last_run_at = started.replace(tzinfo=None)
+            record.last_duration_ms = int(duration * 1000)
+            record.last_lag_ms = int(lag * 1000)
+            record.last_status = status
+            record.run_count += 1
+            if event.exception:
+                record.error_count += 1
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            app.logger.exception(f"Falha ao registrar a execução do job {event.job_id}")
+
+
+def _running_cli_command():
+    """True para comandos `flask ...` (db upgrade, shell, ...), exceto `flask run`."""
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.info_name != 'run'
+
+
+def start_scheduler(app):
+    """Inicia o agendador neste processo, com heartbeat do lease e registro das execuções."""
+    if not app.config.get('SCHEDULER_ENABLED', True) or _running_cli_command():
+        return
+
+    def heartbeat():
+        with app.app_context():
+            try:
+                _set_leader(app, acquire_lease())
+            except SQLAlchemyError:
+                db.session.rollback()
+                app.logger.warning("Agendador: não foi possível renovar o lease (banco indisponível ou sem migração?)")
+
+    def on_job_event(event):
+        if event.code == EVENT_JOB_MISSED:
+            app.logger.warning(f"Job {event.job_id} perdeu o horário previsto ({event.scheduled_run_time})")
+        else:
+            _record_run(app, event)
+
+    lease_seconds = app.config.get('SCHEDULER_LEASE_SECONDS', 90)
+    scheduler.add_listener(on_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    scheduler.add_job('scheduler_lease', heartbeat, trigger='interval', seconds=max(lease_seconds // 3, 1),
+                      next_run_time=datetime.now(), replace_existing=True)
+    scheduler.start()
+
+
+def scheduler_status():
+    """Estado do lease e das últimas execuções, para o painel do admin."""
+    lease = db.session.get(SchedulerLease, LEASE_NAME)
+    return {
+        'holder': HOLDER_ID,
+        'is_leader': _is_leader,
+        'lease': {
+            'holder': lease.holder,
+            'expires_at': lease.expires_at.isoformat(),
+        } if lease else None,
+        'jobs': [
+            {
+                'job_id': run.job_id,
+                'holder': run.holder,
+                'last_run_at': run.last_run_at.isoformat() if run.last_run_at else None,
+                'last_duration_ms': run.last_duration_ms,
+                'last_lag_ms': run.last_lag_ms,
+                'last_status': run.last_status,
+                'run_count': run.run_count,
+                'error_count': run.error_count,
+            }
+            for run in ScheduledJobRun.query.order_by(ScheduledJobRun.job_id).all()
+        ],
+    }
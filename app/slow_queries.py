@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .query_stats import statement_shape
+
+logger = logging.getLogger('app.slow_queries')
+logger.propagate = False
+
+_EXPLAINABLE = ('select', 'with', 'update', 'delete', 'insert')
+
+
+def fingerprint(shape):
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+
+
+def parameter_shape(parameters, limit=20):
+    """Tipos dos parâmetros ligados, sem os valores (o log não guarda dados dos usuários)."""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in list(parameters.items())[:limit]}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters[:limit]]
+    return type(parameters).__name__
+
+
+def query_origin():
+    """Endpoint da requisição ou, fora dela, o job agendado (g.query_origin) que executou o statement."""
+    if has_request_context():
+        return request.endpoint or request.path
+    if has_app_context():
+        return g.get('query_origin', 'background')
+    return 'background'
+
+
+def explain_query_plan(conn, statement, parameters):
+    """Plano do EXPLAIN QUERY PLAN (SQLite) numa conexão DBAPI à parte dos eventos; None se não der."""
+    if conn.dialect.name != 'sqlite' or not statement.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        return None
+    # (id, parent, notused, detail): indenta cada passo pela profundidade na árvore
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+class SlowQueryLog:
+    """Log de statements acima de SLOW_QUERY_THRESHOLD_MS, com o EXPLAIN QUERY PLAN capturado.
+
+    Cada statement lento vira uma linha JSON no arquivo rotativo SLOW_QUERY_LOG: fingerprint do
+    formato normalizado, tipos dos parâmetros, origem (endpoint ou job) e plano. O plano é
+    capturado na primeira ocorrência de cada fingerprint por processo. O painel do admin
+    (/admin/slow-queries) agrega o arquivo atual e os rotacionados por fingerprint.
+    """
+
+    def __init__(self, app=None):
+        self.threshold = None
+        self.path = None
+        self.explained = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['slow_queries'] = self
+        if not app.config.get('SLOW_QUERY_ENABLED', True):
+            return
+
+        self.threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+        self.path = app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.log')
+        self.backups = app.config.get('SLOW_QUERY_BACKUPS', 5)
+
+        path = os.path.abspath(self.path)
+        if not any(getattr(handler, 'baseFilename', None) == path for handler in logger.handlers):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(path, maxBytes=app.config.get('SLOW_QUERY_MAX_BYTES', 5 * 1024 * 1024),
+                                          backupCount=self.backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        if not event.contains(Engine, 'after_cursor_execute', self._after_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('slow_query_start')
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        if self.threshold is None or duration < self.threshold:
+            return
+
+        shape = statement_shape(statement)
+        key = fingerprint(shape)
+        plan = None
+        if self.explain and not executemany and key not in self.explained:
+            self.explained.add(key)
+            plan = explain_query_plan(conn, statement, parameters)
+
+        logger.info(json.dumps({
+            'at': datetime.utcnow().isoformat(timespec='seconds'),
+            'fingerprint': key,
+            'duration_ms': round(duration * 1000, 2),
+            'origin': query_origin(),
+            'statement': shape,
+            'parameters': parameter_shape(parameters[0] if executemany and parameters else parameters),
+            'executemany': executemany,
+            'plan': plan,
+        }, ensure_ascii=False))
+
+    def log_files(self):
+        """Arquivo atual e rotacionados, do mais antigo para o mais novo."""
+        if not self.path:
+            return []
+        candidates = [f'{self.path}.{n}' for n in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in candidates if os.path.exists(path)]
+
+    def top_offenders(self, limit=50, sort='total'):
+        """Statements lentos agregados por fingerprint, ordenados por sort (total, count ou max)."""
+        aggregated = {}
+        for path in self.log_files():
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    item = aggregated.get(entry['fingerprint'])
+                    if item is None:
+                        item = aggregated[entry['fingerprint']] = {
+                            'fingerprint': entry['fingerprint'], 'statement': entry['statement'],
+                            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'origins': {}, 'plan': None,
+                            'parameters': entry.get('parameters'), 'last_at': None,
+                        }
+                    item['count'] += 1
+                    item['total_ms'] += entry['duration_ms']
+                    item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+                    item['origins'][entry['origin']] = item['origins'].get(entry['origin'], 0) + 1
+                    item['plan'] = entry.get('plan') or item['plan']
+                    item['last_at'] = entry['at']
+
+        key = {'count': 'count', 'max': 'max_ms'}.get(sort, 'total_ms')
+        ranked = sorted(aggregated.values(), key=lambda item: item[key], reverse=True)[:limit]
+        for item in ranked:
+            item['avg_ms'] = item['total_ms'] / item['count']
+            item['origins'] = sorted(item['origins'].items(), key=lambda origin: origin[1], reverse=True)
+        return ranked
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
@@ -15,5 +15,60 @@ class Config:
     VERSAO_APP = 'Beta 1.2.0'
     ANO_ATUAL = datetime.now().year
     
+    # Cache do dashboard: 'memory' (LRU por processo), 'filesystem' (compartilhado entre workers)
+    # ou 'pacote.modulo:Classe' para um backend próprio
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_MAX_ENTRIES = 512
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+
+    # Exibe o total (aproximado, em cache por versão dos dados) nas listagens paginadas
+    PAGINATION_TOTALS = True
+
+    # Agendador: cada processo inicia o APScheduler, mas só o líder (lease no banco) executa os jobs.
+    # Use SCHEDULER_ENABLED=0 em processos que não devem agendar nada.
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    SCHEDULER_LEASE_SECONDS = 90
+    SCHEDULER_JOB_DEFAULTS = {'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 900}
+
+    # Instrumentação SQL por requisição: header Server-Timing, log por requisição e painel do admin.
+    # Formatos de consulta repetidos QUERY_STATS_NPLUSONE_THRESHOLD vezes são sinalizados como N+1.
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    QUERY_STATS_PANEL = True
+    QUERY_STATS_SLOWEST = 5
+    QUERY_STATS_NPLUSONE_THRESHOLD = 5
+
+    # Profiler sob demanda (admins): ?_profile=1 ou header X-Profile grava <id>.prof e <id>.collapsed
+    PROFILER_ENABLED = True
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or os.path.join(basedir, 'profiles')
+    PROFILER_INTERVAL_MS = 5
+    PROFILER_MAX_FILES = 50
+
+    # Comandos de desenvolvimento do pacote tools (`flask loadtest`, `bench`, `query-budget` e
+    # `query-plans`): só são registrados com DEV_COMMANDS=1, para não pesarem no import dos workers
+    DEV_COMMANDS = os.environ.get('DEV_COMMANDS', '0').lower() not in ('0', 'false', 'no')
+
+    # Microbenchmarks (`flask bench`): baseline.json e bancos gerados (data/) ficam em BENCHMARK_DIR;
+    # --check falha se o tempo (mínimo das amostras) ou o pico de memória piorarem mais que BENCHMARK_THRESHOLD
+    BENCHMARK_DIR = os.environ.get('BENCHMARK_DIR') or os.path.join(basedir, 'benchmarks')
+    BENCHMARK_THRESHOLD = 0.20
+
+    # Métricas no formato do Prometheus em /metrics, para admins logados ou com
+    # 'Authorization: Bearer <METRICS_TOKEN>'. Com vários processos (gunicorn), aponte METRICS_DIR
+    # para um diretório compartilhado e limpo a cada deploy: cada processo grava seu snapshot lá
+    # a cada METRICS_FLUSH_SECONDS e a exposição soma todos.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_FLUSH_SECONDS = 5
+
+    # Log de consultas lentas: statements acima de SLOW_QUERY_THRESHOLD_MS vão, com o EXPLAIN QUERY PLAN,
+    # para SLOW_QUERY_LOG (rotativo); o painel /admin/slow-queries agrega por formato do statement
+    SLOW_QUERY_ENABLED = os.environ.get('SLOW_QUERY_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS') or 100)
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or os.path.join(basedir, 'logs', 'slow_queries.log')
+    SLOW_QUERY_MAX_BYTES = 5 * 1024 * 1024
+    SLOW_QUERY_BACKUPS = 5
+    SLOW_QUERY_EXPLAIN = True
+
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads', 'profile_pics')
     
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""Indices compostos de receitas e despesas
+
+Revision ID: 34bc20ad870b
+Revises: 9f17348771bf
+Create Date: 2026-10-18 11:58:22.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '34bc20ad870b'
+down_revision = '9f17348771bf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_user_paid_due', ['user_id', 'is_paid', 'due_date'], unique=False)
+        batch_op.create_index('ix_expense_user_paid_payment', ['user_id', 'is_paid', 'payment_date'], unique=False)
+
+    with op.batch_alter_table('revenue_transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_revenue_user_received_due', ['user_id', 'is_received', 'due_date'], unique=False)
+        batch_op.create_index('ix_revenue_user_received_receipt', ['user_id', 'is_received', 'receipt_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revenue_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_revenue_user_received_receipt')
+        batch_op.drop_index('ix_revenue_user_received_due')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_user_paid_payment')
+        batch_op.drop_index('ix_expense_user_paid_due')
@@ -0,0 +1,31 @@
+"""Contagens de notificacao do usuario
+
+Revision ID: 5c1e7a93d2b4
+Revises: d6ee01967f25
+Create Date: 2026-10-18 13:20:51.904337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e7a93d2b4'
+down_revision = 'd6ee01967f25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # notif_day nulo: as contagens são calculadas no primeiro acesso ou no job diário
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notif_day', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('notif_revenue_today', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('notif_expense_today', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('notif_expense_today')
+        batch_op.drop_column('notif_revenue_today')
+        batch_op.drop_column('notif_day')
@@ -0,0 +1,40 @@
+"""Saldo materializado na carteira
+
+Revision ID: 9abcf0af0179
+Revises: 44efd7cbf8e4
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9abcf0af0179'
+down_revision = '44efd7cbf8e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('wallet', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('balance', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    # Backfill: saldo inicial + receitas recebidas - despesas pagas
+    wallet = sa.table('wallet', sa.column('id'), sa.column('initial_balance'), sa.column('balance'))
+    revenue = sa.table('revenue_transaction', sa.column('wallet_id'), sa.column('amount'), sa.column('is_received', sa.Boolean))
+    expense = sa.table('expense', sa.column('wallet_id'), sa.column('amount'), sa.column('is_paid', sa.Boolean))
+
+    received = sa.select(sa.func.coalesce(sa.func.sum(revenue.c.amount), 0)) \
+        .where(revenue.c.wallet_id == wallet.c.id, revenue.c.is_received == sa.true()) \
+        .scalar_subquery()
+    paid = sa.select(sa.func.coalesce(sa.func.sum(expense.c.amount), 0)) \
+        .where(expense.c.wallet_id == wallet.c.id, expense.c.is_paid == sa.true()) \
+        .scalar_subquery()
+
+    op.execute(wallet.update().values(balance=wallet.c.initial_balance + received - paid))
+
+
+def downgrade():
+    with op.batch_alter_table('wallet', schema=None) as batch_op:
+        batch_op.drop_column('balance')
@@ -0,0 +1,66 @@
+"""Tabela monthly_rollup
+
+Revision ID: 9f17348771bf
+Revises: 9abcf0af0179
+Create Date: 2026-10-18 10:41:07.532918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f17348771bf'
+down_revision = '9abcf0af0179'
+branch_labels = None
+depends_on = None
+
+
+def _first_of_month(column):
+    if op.get_bind().dialect.name == 'sqlite':
+        return sa.func.date(column, 'start of month')
+    return sa.cast(sa.func.date_trunc('month', column), sa.Date)
+
+
+def upgrade():
+    op.create_table('monthly_rollup',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('wallet_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('basis', sa.String(length=10), nullable=False),
+    sa.Column('total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('tx_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'month', 'wallet_id', 'category_id', 'kind', 'basis')
+    )
+
+    # Backfill: 'projected' pelo mês do vencimento de todos os lançamentos e 'realized' pelo mês
+    # da baixa dos recebidos/pagos (o mesmo que flask rebuild-rollups, que segue como reparo)
+    rollup = sa.table('monthly_rollup', *(sa.column(name) for name in (
+        'user_id', 'month', 'wallet_id', 'category_id', 'kind', 'basis', 'total', 'tx_count')))
+    sources = (
+        ('revenue_transaction', 'revenue', 'is_received', 'receipt_date'),
+        ('expense', 'expense', 'is_paid', 'payment_date'),
+    )
+    for table_name, kind, settled, settled_at in sources:
+        table = sa.table(table_name, sa.column('id'), sa.column('user_id'), sa.column('wallet_id'),
+                         sa.column('category_id'), sa.column('amount'), sa.column('due_date'),
+                         sa.column(settled, sa.Boolean), sa.column(settled_at))
+        for basis, when, conditions in (
+            ('projected', table.c.due_date, []),
+            ('realized', table.c[settled_at], [table.c[settled] == sa.true(), table.c[settled_at].isnot(None)]),
+        ):
+            month = _first_of_month(when)
+            query = sa.select(
+                table.c.user_id, month, table.c.wallet_id, table.c.category_id,
+                sa.literal(kind), sa.literal(basis), sa.func.round(sa.func.sum(table.c.amount), 2),
+                sa.func.count(table.c.id)
+            ).where(*conditions).group_by(table.c.user_id, month, table.c.wallet_id, table.c.category_id)
+            op.execute(rollup.insert().from_select(
+                ['user_id', 'month', 'wallet_id', 'category_id', 'kind', 'basis', 'total', 'tx_count'], query))
+
+
+def downgrade():
+    op.drop_table('monthly_rollup')
@@ -0,0 +1,42 @@
+"""Proxima execucao dos recorrentes (next_run_at)
+
+Revision ID: b73f0e2c91a6
+Revises: 5c1e7a93d2b4
+Create Date: 2026-10-18 14:02:33.718450
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b73f0e2c91a6'
+down_revision = '5c1e7a93d2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_run_at', sa.Date(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_expense_next_run_at'), ['next_run_at'], unique=False)
+
+    with op.batch_alter_table('revenue_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_run_at', sa.Date(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_revenue_transaction_next_run_at'), ['next_run_at'], unique=False)
+
+    # Backfill conservador: o vencimento do template nunca é posterior à próxima ocorrência,
+    # então a primeira execução do job revisa todos e grava o next_run_at definitivo
+    for table_name in ('expense', 'revenue_transaction'):
+        table = sa.table(table_name, sa.column('due_date'), sa.column('next_run_at'), sa.column('is_recurrent', sa.Boolean))
+        op.execute(table.update().where(table.c.is_recurrent == sa.true()).values(next_run_at=table.c.due_date))
+
+
+def downgrade():
+    with op.batch_alter_table('revenue_transaction', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revenue_transaction_next_run_at'))
+        batch_op.drop_column('next_run_at')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_expense_next_run_at'))
+        batch_op.drop_column('next_run_at')
@@ -0,0 +1,26 @@
+"""Versao de dados do usuario (data_version)
+
+Revision ID: d6ee01967f25
+Revises: 34bc20ad870b
+Create Date: 2026-10-18 13:20:45.271930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6ee01967f25'
+down_revision = '34bc20ad870b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
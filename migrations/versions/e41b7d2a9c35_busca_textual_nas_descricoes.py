@@ -0,0 +1,67 @@
+"""Busca textual nas descricoes (FTS5)
+
+Revision ID: e41b7d2a9c35
+Revises: 8378091f7620
+Create Date: 2026-10-18 16:20:11.904512
+
+Tabelas FTS5 de conteúdo externo sobre revenue_transaction e expense, sincronizadas por
+triggers (inclusive nos inserts/updates/deletes em lote, que não passam pelo ORM).
+Atenção: migrações em batch que recriam essas tabelas no SQLite descartam os triggers;
+nesse caso é preciso recriá-los e rodar o 'rebuild'.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7d2a9c35'
+down_revision = '8378091f7620'
+branch_labels = None
+depends_on = None
+
+SEARCH_TABLES = {
+    'revenue_search': 'revenue_transaction',
+    'expense_search': 'expense',
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for search, source in SEARCH_TABLES.items():
+        op.execute(
+            f"CREATE VIRTUAL TABLE {search} USING fts5("
+            f"description, content='{source}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {search}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {search}(rowid, description) VALUES (new.id, new.description); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {search}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {search}({search}, rowid, description) VALUES ('delete', old.id, old.description); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {search}_au AFTER UPDATE OF description ON {source} BEGIN "
+            f"INSERT INTO {search}({search}, rowid, description) VALUES ('delete', old.id, old.description); "
+            f"INSERT INTO {search}(rowid, description) VALUES (new.id, new.description); END"
+        )
+        # Indexa as descrições já existentes
+        op.execute(f"INSERT INTO {search}({search}) VALUES ('rebuild')")
+
+    # Sem estatísticas o planejador supõe que user_id é seletivo e percorre todos os lançamentos
+    # do usuário testando o IN da busca; com sqlite_stat1 ele parte dos resultados do FTS
+    op.execute("ANALYZE")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for search in SEARCH_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {search}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {search}")
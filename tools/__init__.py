@@ -0,0 +1,15 @@
+"""Ferramentas de desenvolvimento: teste de carga, microbenchmarks, orçamento de consultas e planos.
+
+Ficam fora do pacote app para não entrarem no caminho de import dos workers; o create_app só
+registra os comandos com DEV_COMMANDS ligado.
+"""
+
+
+def register_commands(app):
+    from .loadtest import loadtest_command
+    from .benchmarks import bench_command
+    from .query_budget import query_budget_command
+    from .query_plans import query_plans_command
+
+    for command in (loadtest_command, bench_command, query_budget_command, query_plans_command):
+        app.cli.add_command(command)
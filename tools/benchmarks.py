@@ -0,0 +1,354 @@
+import os
+import json
+import random
+import shutil
+import logging
+import platform
+import statistics
+import time
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.extensions import db
+
+# Conjuntos de dados fixos gerados pelo `flask seed` (mesma semente e mesma data de referência)
+DATASETS = {
+    '1k': dict(users=1, revenues=200, expenses=800),
+    '100k': dict(users=33, revenues=600, expenses=2400),
+    '1m': dict(users=333, revenues=600, expenses=2400),
+}
+DEFAULT_SIZES = ('1k', '100k')
+BENCH_SEED = 2024
+BENCH_ANCHOR = date(2026, 1, 15)
+# Diferenças abaixo destes pisos não contam como regressão (ruído de medição)
+MIN_DELTA_MS = 0.5
+MIN_DELTA_KB = 64
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registra um benchmark: fn(dataset) prepara os dados e retorna a função medida."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+@dataclass
+class Dataset:
+    size: str
+    rows: int
+    path: str
+    user_id: int
+    rng: random.Random
+
+    def reset(self):
+        reset_work_copy(self.path)
+
+
+@dataclass
+class Measured:
+    fn: object
+    reset: bool = False
+
+
+# Funções puras: entradas com dataset.rows elementos
+
+@benchmark('recurrence.next_occurrence')
+def bench_next_occurrence(dataset):
+    from app.financeiro.recurrence import next_occurrence, FREQUENCY_UNITS
+    frequencies = list(FREQUENCY_UNITS)
+    anchors = [(BENCH_ANCHOR - timedelta(days=dataset.rng.randrange(3 * 365)), dataset.rng.choice(frequencies))
+               for _ in range(dataset.rows)]
+
+    def run():
+        for anchor, frequency in anchors:
+            next_occurrence(anchor, frequency, BENCH_ANCHOR)
+    return Measured(run)
+
+
+@benchmark('recurrence.occurrences_between')
+def bench_occurrences_between(dataset):
+    from app.financeiro.recurrence import occurrences_between
+    after = BENCH_ANCHOR - timedelta(days=30)
+    anchors = [(BENCH_ANCHOR - timedelta(days=dataset.rng.randrange(3 * 365)), dataset.rng.choice(['weekly', 'monthly']))
+               for _ in range(dataset.rows)]
+
+    def run():
+        for anchor, frequency in anchors:
+            occurrences_between(anchor, frequency, after, BENCH_ANCHOR)
+    return Measured(run)
+
+
+@benchmark('filters.currency')
+def bench_currency(dataset):
+    from app.filters import format_currency
+    values = [Decimal(dataset.rng.randrange(1, 10 ** 8)) / 100 for _ in range(dataset.rows)]
+
+    def run():
+        for value in values:
+            format_currency(value)
+    return Measured(run)
+
+
+# Funções sobre o banco: o usuário com mais lançamentos do conjunto
+
+@benchmark('main.get_monthly_data')
+def bench_monthly_data(dataset):
+    from app.main.routes import get_monthly_data
+    return Measured(lambda: get_monthly_data(dataset.user_id))
+
+
+@benchmark('main.get_category_data')
+def bench_category_data(dataset):
+    from app.main.routes import get_category_data
+    return Measured(lambda: get_category_data(dataset.user_id))
+
+
+@benchmark('Wallet.current_balance')
+def bench_current_balance(dataset):
+    from app.financeiro.models import Wallet
+
+    def run():
+        return sum(wallet.current_balance for wallet in Wallet.query.filter_by(user_id=dataset.user_id))
+    return Measured(run)
+
+
+@benchmark('Wallet.balances_for_user')
+def bench_balances_for_user(dataset):
+    from app.financeiro.models import Wallet
+    return Measured(lambda: Wallet.balances_for_user(dataset.user_id))
+
+
+@benchmark('tasks.process_recurrent_transactions')
+def bench_process_recurrent(dataset):
+    from app.financeiro.tasks import process_recurrent_transactions
+    # 60 dias de atraso: lança as ocorrências pendentes de todos os templates do conjunto
+    return Measured(lambda: process_recurrent_transactions(today=BENCH_ANCHOR + timedelta(days=60)), reset=True)
+
+
+def work_path(path):
+    return f'{path[:-3]}.work.db'
+
+
+def reset_work_copy(path):
+    """Restaura a cópia de trabalho do banco a partir do conjunto original (benchmarks que escrevem)."""
+    db.session.remove()
+    db.engine.dispose()
+    shutil.copyfile(path, work_path(path))
+
+
+def dataset_app(path, **settings):
+    """App apontando para a cópia de trabalho do conjunto de dados, sem agendador (settings sobrepõe a config)."""
+    from app import create_app
+    from config import Config
+
+    work = work_path(path)
+    config = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{work}',
+        'SCHEDULER_ENABLED': False,
+        'QUERY_STATS_ENABLED': False,
+        **settings,
+    })
+    return create_app(config)
+
+
+def build_dataset(size, directory, spec=None):
+    """Gera (uma vez) o banco do conjunto size em directory e retorna o caminho.
+
+    spec são as opções do `flask seed` (SeedOptions); por padrão, as de DATASETS[size].
+    """
+    from flask_migrate import upgrade
+    from app.financeiro.seed import SeedOptions, seed
+
+    path = os.path.join(directory, f'dataset-{size}-{BENCH_SEED}-{BENCH_ANCHOR:%Y%m%d}.db')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    building = work_path(path)
+    if os.path.exists(building):
+        os.remove(building)
+    app = dataset_app(path)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(app.root_path), 'migrations'))
+        seed(SeedOptions(**(spec or DATASETS[size]), seed=BENCH_SEED, anchor=BENCH_ANCHOR, prefix='bench'))
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+    os.replace(building, path)
+    return path
+
+
+def measure(fn, repeat, reset):
+    """Tempo por chamada (mediana e mínimo de repeat amostras) e pico de memória (tracemalloc, à parte).
+
+    Sem reset, cada amostra repete a chamada o bastante para durar ~0,2s (timeit.autorange), o que
+    dilui o ruído em funções de milissegundos; com reset, cada amostra é uma chamada sobre o banco restaurado.
+    """
+    if reset:
+        timings = []
+        for _ in range(repeat):
+            reset()
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+            db.session.remove()
+    else:
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        timings = [total / number * 1000 for total in timer.repeat(repeat, number)]
+        db.session.remove()
+
+    if reset:
+        reset()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        db.session.remove()
+
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(sizes, names, repeat, directory, echo):
+    from app.financeiro.models import Expense
+
+    results = {}
+    for size in sizes:
+        echo(f'Conjunto {size}: preparando...')
+        path = build_dataset(size, directory)
+        app = dataset_app(path)
+        with app.app_context():
+            reset_work_copy(path)
+            spec = DATASETS[size]
+            heaviest_user = db.session.scalar(
+                db.select(Expense.user_id).group_by(Expense.user_id)
+                .order_by(db.func.count().desc(), Expense.user_id).limit(1)
+            )
+            dataset = Dataset(size, spec['users'] * (spec['revenues'] + spec['expenses']), path,
+                              heaviest_user, random.Random())
+            for name in names:
+                dataset.rng.seed(f'{BENCH_SEED}:{name}')
+                measured = BENCHMARKS[name](dataset)
+                stats = measure(measured.fn, repeat, dataset.reset if measured.reset else None)
+                results[f'{name}@{size}'] = stats
+                echo(f"  {name:<40} {stats['median_ms']:>10.2f} ms (mín {stats['min_ms']:.2f})  "
+                     f"pico {stats['peak_kb']:>10.1f} KB")
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Regressões de tempo e de pico de memória acima de threshold em relação à baseline.
+
+    O tempo comparado é o mínimo das execuções, bem menos sensível a ruído da máquina que a mediana.
+    Resultados sem valor na baseline são ignorados aqui (o --check os trata à parte).
+    """
+    regressions = []
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric, floor in (('min_ms', MIN_DELTA_MS), ('peak_kb', MIN_DELTA_KB)):
+            before, after = base[metric], stats[metric]
+            if after > before * (1 + threshold) and after - before > floor:
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+@click.command('bench')
+@click.option('--sizes', default=','.join(DEFAULT_SIZES), show_default=True,
+              help=f'Conjuntos de dados ({", ".join(DATASETS)}), separados por vírgula.')
+@click.option('--only', default='', help='Roda só os benchmarks cujo nome contém um destes trechos (vírgula).')
+@click.option('--repeat', default=5, show_default=True, help='Amostras medidas por benchmark.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='Grava os resultados em JSON.')
+@click.option('--save-baseline', is_flag=True, help='Grava os resultados como nova baseline.')
+@click.option('--check', is_flag=True, help='Compara com a baseline e falha (código 1) se houver regressão.')
+@click.option('--threshold', type=float, default=None,
+              help='Piora relativa tolerada no --check (padrão: BENCHMARK_THRESHOLD).')
+@with_appcontext
+def bench_command(sizes, only, repeat, output, save_baseline, check, threshold):
+    """Microbenchmarks (tempo e pico de memória) das funções financeiras mais usadas."""
+    from .loadtest import git_commit
+
+    sizes = [size.strip() for size in sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in DATASETS]
+    if unknown:
+        raise click.BadParameter(f'conjunto desconhecido: {", ".join(unknown)}', param_hint='--sizes')
+    patterns = [p.strip() for p in only.split(',') if p.strip()]
+    names = [name for name in BENCHMARKS if not patterns or any(p in name for p in patterns)]
+
+    config = current_app.config
+    directory = config['BENCHMARK_DIR']
+    baseline_path = os.path.join(directory, 'baseline.json')
+    threshold = config['BENCHMARK_THRESHOLD'] if threshold is None else threshold
+
+    # Os logs de INFO do processamento de recorrências distorceriam as medições
+    logging.disable(logging.INFO)
+    try:
+        results = run_benchmarks(sizes, names, max(repeat, 1), os.path.join(directory, 'data'), click.echo)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f'Resultados gravados em {output}.')
+
+    if check:
+        if not os.path.exists(baseline_path):
+            raise click.ClickException(f'Baseline não encontrada em {baseline_path}; gere com --save-baseline.')
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], threshold)
+        for key, metric, before, after in regressions:
+            click.echo(f'REGRESSÃO {key} {metric}: {before} -> {after} ({(after / before - 1) * 100 if before else 0:+.0f}%)')
+        # Sem valor na baseline não há com o que comparar: falha em vez de passar sem conferir nada
+        missing = [key for key in results if key not in baseline['results']]
+        for key in missing:
+            click.echo(f'SEM BASELINE {key}')
+        if regressions:
+            click.echo(f'{len(regressions)} regressão(ões) acima de {threshold:.0%} em relação à baseline '
+                       f"(commit {baseline['meta'].get('commit')}).")
+        if missing:
+            click.echo(f'{len(missing)} resultado(s) sem valor na baseline; grave-os com --save-baseline.')
+        if regressions or missing:
+            raise SystemExit(1)
+        click.echo(f'Nenhuma regressão acima de {threshold:.0%} em relação à baseline.')
+
+    if save_baseline:
+        if os.path.exists(baseline_path):
+            with open(baseline_path, encoding='utf-8') as f:
+                previous = json.load(f)['results']
+            # Conjuntos/benchmarks não executados agora continuam com o valor anterior
+            report['results'] = {**previous, **results}
+        os.makedirs(directory, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        click.echo(f'Baseline gravada em {baseline_path}.')
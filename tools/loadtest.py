@@ -0,0 +1,308 @@
+import re
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import threading
+import subprocess
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.exceptions import HTTPException
+
+from app.extensions import db
+
+# Pesos padrão das jornadas; alterar com --mix dashboard=40,pay=0,...
+DEFAULT_MIX = {
+    'dashboard': 30,
+    'expenses': 20,
+    'revenues': 15,
+    'add_expense': 10,
+    'pay': 10,
+    'bulk_pay': 5,
+    'login': 5,
+}
+BULK_PAY_SIZE = 20
+SEARCH_WORDS = ['mercado', 'uber', 'aluguel', 'conta', 'farm', 'salario', 'restaurante']
+
+_CSRF = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def percentile(ordered, p):
+    """Percentil por posição mais próxima (nearest-rank) de uma lista já ordenada."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class Recorder:
+    """Latências por endpoint (método + endpoint do Flask), compartilhadas entre as threads."""
+
+    def __init__(self, app):
+        self.adapter = app.url_map.bind('localhost')
+        self.samples = {}
+        self.errors = {}
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def endpoint(self, method, path):
+        try:
+            endpoint, _ = self.adapter.match(path.split('?', 1)[0], method=method)
+        except HTTPException:
+            endpoint = path
+        return f'{method} {endpoint}'
+
+    def record(self, key, seconds, ok):
+        if not self.recording:
+            return
+        with self._lock:
+            self.samples.setdefault(key, []).append(seconds)
+            if not ok:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for key, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            endpoints[key] = {
+                'requests': len(ordered),
+                'errors': self.errors.get(key, 0),
+                'rps': round(len(ordered) / elapsed, 2),
+                'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+                'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+                'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+                'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2),
+            }
+        everything = sorted(s for samples in self.samples.values() for s in samples)
+        total = {
+            'requests': len(everything),
+            'errors': sum(self.errors.values()),
+            'rps': round(len(everything) / elapsed, 2),
+            'p50_ms': round(percentile(everything, 50) * 1000, 2) if everything else None,
+            'p95_ms': round(percentile(everything, 95) * 1000, 2) if everything else None,
+            'p99_ms': round(percentile(everything, 99) * 1000, 2) if everything else None,
+        }
+        return endpoints, total
+
+
+class VirtualUser:
+    """Um usuário simulado: cliente de teste próprio (cookies/sessão) e roteiro de jornadas sorteadas."""
+
+    def __init__(self, app, recorder, account, rng):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.rng = rng
+        self.email = account['email']
+        self.password = account['password']
+        self.wallet_ids = account['wallet_ids']
+        self.category_ids = account['category_ids']
+        self.pending_ids = account['pending_ids']
+
+    def request(self, method, path, data=None):
+        key = self.recorder.endpoint(method, path)
+        started = time.perf_counter()
+        try:
+            response = self.client.open(path, method=method, data=data)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.recorder.record(key, time.perf_counter() - started, ok)
+        return response
+
+    def csrf_token(self, path):
+        response = self.request('GET', path)
+        match = _CSRF.search(response.get_data(as_text=True)) if response is not None else None
+        return match.group(1) if match else ''
+
+    # Jornadas
+
+    def login(self):
+        self.client.get('/logout')
+        token = self.csrf_token('/login')
+        self.request('POST', '/login', {'csrf_token': token, 'email': self.email, 'password': self.password})
+
+    def dashboard(self):
+        self.request('GET', '/')
+
+    def expenses(self):
+        query = f'desc_filter={self.rng.choice(SEARCH_WORDS)}'
+        if self.rng.random() < 0.5:
+            query += f'&wallet_filter={self.rng.choice(self.wallet_ids)}'
+        if self.rng.random() < 0.5:
+            year = date.today().year - self.rng.randint(0, 2)
+            query += f'&date_start={year}-01-01&date_end={year}-12-31'
+        self.request('GET', f'/financeiro/despesas?{query}')
+
+    def revenues(self):
+        query = f'wallet_filter={self.rng.choice(self.wallet_ids)}'
+        if self.rng.random() < 0.5:
+            query += f'&desc_filter={self.rng.choice(SEARCH_WORDS)}'
+        self.request('GET', f'/financeiro/receitas?{query}')
+
+    def add_expense(self):
+        token = self.csrf_token('/financeiro/despesas/add')
+        today = date.today().isoformat()
+        self.request('POST', '/financeiro/despesas/add', {
+            'csrf_token': token,
+            'description': f'Carga {self.rng.randint(1, 10 ** 6)}',
+            'amount': f'{self.rng.lognormvariate(4, 0.8):.2f}',
+            'due_date': today,
+            'date': today,
+            'status': self.rng.choice(['pending', 'paid']),
+            'payment_date': today,
+            'item': self.rng.choice(self.category_ids),
+            'wallet': self.rng.choice(self.wallet_ids),
+            'num_repetitions': '0',
+        })
+
+    def pay(self):
+        if self.pending_ids:
+            self.request('POST', f'/financeiro/despesas/pay/{self.pending_ids.pop()}')
+
+    def bulk_pay(self):
+        if self.pending_ids:
+            batch = [self.pending_ids.pop() for _ in range(min(BULK_PAY_SIZE, len(self.pending_ids)))]
+            self.request('POST', '/financeiro/despesas/bulk', {'action_type': 'pay', 'selected_ids': batch})
+
+    def run(self, mix, deadline):
+        journeys, weights = zip(*mix.items())
+        self.login()
+        while time.perf_counter() < deadline:
+            getattr(self, self.rng.choices(journeys, weights)[0])()
+
+
+def load_accounts(prefix, password, count):
+    """Contas geradas pelo `flask seed` (prefix00001@example.com...), com ids para os formulários."""
+    from app.auth.models import User
+    from app.financeiro.models import Wallet, ExpenseCategory, Expense
+
+    emails = [f'{prefix}{n:05d}@example.com' for n in range(1, count + 1)]
+    users = db.session.execute(db.select(User.id, User.email).where(User.email.in_(emails)).order_by(User.id)).all()
+    accounts = []
+    for user_id, email in users:
+        accounts.append({
+            'email': email,
+            'password': password,
+            'wallet_ids': db.session.scalars(db.select(Wallet.id).where(Wallet.user_id == user_id)).all(),
+            'category_ids': db.session.scalars(
+                db.select(ExpenseCategory.id).where(ExpenseCategory.user_id == user_id)).all(),
+            'pending_ids': db.session.scalars(
+                db.select(Expense.id).where(Expense.user_id == user_id, Expense.is_paid == False)
+                .order_by(Expense.id)).all(),
+        })
+    return accounts
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (text or '').split(',')):
+        name, _, weight = item.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise click.BadParameter(f'jornada desconhecida: {name} (opções: {", ".join(DEFAULT_MIX)})')
+        mix[name.strip()] = float(weight or 0)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=current_app.root_path, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_load_test(app, accounts, concurrency, duration, warmup, mix, seed):
+    """Roda concurrency usuários simulados por warmup + duration segundos; mede só após o aquecimento."""
+    recorder = Recorder(app)
+    users = [VirtualUser(app, recorder, accounts[n % len(accounts)], random.Random(seed * 1000 + n))
+             for n in range(concurrency)]
+    # Usuários virtuais que compartilham uma conta não podem pagar a mesma despesa
+    for n, user in enumerate(users):
+        if n >= len(accounts):
+            user.pending_ids = []
+
+    start = time.perf_counter()
+    deadline = start + warmup + duration
+    threads = [threading.Thread(target=user.run, args=(mix, deadline), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(warmup)
+    recorder.recording = True
+    measured_from = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    recorder.recording = False
+    return recorder.summary(time.perf_counter() - measured_from)
+
+
+@click.command('loadtest')
+@click.option('--concurrency', '-c', default=4, show_default=True, help='Usuários simulados em paralelo (threads).')
+@click.option('--duration', '-d', default=30.0, show_default=True, help='Segundos de medição.')
+@click.option('--warmup', default=3.0, show_default=True, help='Segundos de aquecimento, fora das estatísticas.')
+@click.option('--users', default=10, show_default=True, help='Contas do `flask seed` usadas (prefix00001...).')
+@click.option('--prefix', default='seed', show_default=True, help='Prefixo das contas geradas pelo `flask seed`.')
+@click.option('--password', default='seed1234', show_default=True, help='Senha das contas geradas.')
+@click.option('--mix', default='', help='Pesos das jornadas, ex.: "dashboard=50,pay=0" (padrão: '
+              + ','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()) + ').')
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Semente do sorteio das jornadas.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='Grava o relatório JSON neste arquivo.')
+@click.option('--verbose', is_flag=True, help='Mantém o log por requisição durante a medição.')
+@with_appcontext
+def loadtest_command(concurrency, duration, warmup, users, prefix, password, mix, seed_value, output, verbose):
+    """Teste de carga em processo (create_app + cliente de teste) das jornadas principais.
+
+    Use um banco gerado pelo `flask seed` (DATABASE_URL); as jornadas de escrita (add_expense,
+    pay, bulk_pay) alteram os dados, então rode sobre uma cópia para comparar execuções.
+    """
+    app = current_app._get_current_object()
+    mix = parse_mix(mix)
+    accounts = load_accounts(prefix, password, users)
+    if not accounts:
+        raise click.ClickException(f'Nenhuma conta "{prefix}NNNNN@example.com" encontrada; gere-as com `flask seed`.')
+    db.session.remove()
+
+    if not verbose:
+        app.logger.setLevel(logging.WARNING)
+    click.echo(f'{concurrency} usuário(s) simulado(s) sobre {len(accounts)} conta(s), '
+               f'{warmup:.0f}s de aquecimento + {duration:.0f}s de medição...', err=True)
+    endpoints, total = run_load_test(app, accounts, concurrency, duration, warmup, mix, seed_value)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].rsplit('/', 1)[-1],
+            'concurrency': concurrency,
+            'duration_s': duration,
+            'warmup_s': warmup,
+            'accounts': len(accounts),
+            'mix': mix,
+            'seed': seed_value,
+        },
+        'total': total,
+        'endpoints': endpoints,
+    }
+
+    # Tabela legível no stderr; o stdout fica só com o JSON quando não há --output
+    click.echo(f"{'endpoint':<42} {'req':>6} {'err':>4} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}", err=True)
+    for key, stats in endpoints.items():
+        click.echo(f"{key:<42} {stats['requests']:>6} {stats['errors']:>4} {stats['rps']:>8.1f} "
+                   f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}", err=True)
+    click.echo(f"{'total':<42} {total['requests']:>6} {total['errors']:>4} {total['rps']:>8.1f} "
+               f"{total['p50_ms'] or 0:>8.1f} {total['p95_ms'] or 0:>8.1f} {total['p99_ms'] or 0:>8.1f}", err=True)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        click.echo(f'Relatório gravado em {output}.', err=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        click.echo()
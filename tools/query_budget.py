@@ -0,0 +1,317 @@
+import os
+from datetime import date, datetime
+
+import click
+from flask import current_app, g, url_for
+from flask.cli import with_appcontext
+
+from app.extensions import db, cache, query_stats
+from app.query_stats import RequestQueries
+
+# Statements SQL permitidos por rota, numa requisição fria (cache vazio) do usuário medido.
+# Subir um orçamento é uma decisão de revisão: o número não deve depender do volume de dados.
+ROUTE_BUDGETS = {
+    'main.index': 7,
+    'financeiro.revenues': 6,
+    'financeiro.revenues_pending': 2,
+    'financeiro.expenses': 6,
+    'financeiro.expenses_pending': 2,
+    'financeiro.wallets': 3,
+    'admin.list_users': 2,
+    'auth.profile': 1,
+}
+
+# Statements por chamada das leituras agregadas usadas pelas rotas (mesmas regras das rotas):
+# o saldo de todas as carteiras é uma consulta agrupada, qualquer que seja o número de carteiras
+CALL_BUDGETS = {
+    'Wallet.balances_for_user': 1,
+    'main.get_dashboard_payload': 6,
+}
+
+# Statements por requisição em qualquer página das listagens (cursor) ou janela de pendentes
+# (after). A página que atravessa para as datas de liquidação nulas faz um seek a mais (_seek).
+PAGE_BUDGETS = {
+    'financeiro.revenues': 7,
+    'financeiro.expenses': 7,
+    'financeiro.revenues_pending': 2,
+    'financeiro.expenses_pending': 2,
+}
+LISTING_PER_PAGE = 10  # per_page das rotas de listagem
+# Lançamentos forçados a compartilhar a mesma data, para que os empates cruzem páginas e janelas
+TIED_ROWS = 25
+
+# Dois volumes bem diferentes (usuários, carteiras, categorias e lançamentos): uma consulta por
+# linha aparece como diferença de contagem entre eles
+BUDGET_DATASETS = {
+    'small': dict(users=3, wallets=2, revenue_categories=3, expense_categories=4,
+                  revenues=30, expenses=90, recurrent=2, transfers=5),
+    'large': dict(users=15, wallets=6, revenue_categories=8, expense_categories=13,
+                  revenues=600, expenses=2400, recurrent=8, transfers=60),
+}
+
+
+def count_url_queries(app, user_id, urls):
+    """Executa cada url como user_id (admin) e retorna {rótulo: RequestQueries da requisição}.
+
+    Registra um after_request: chame uma vez por app, antes da primeira requisição.
+    """
+    captured = {}
+
+    # Registrado depois do QueryStats, roda antes dele no after_request (ordem inversa) e
+    # ainda encontra as estatísticas da requisição em g
+    @app.after_request
+    def capture_query_stats(response):
+        stats = query_stats.current()
+        if stats is not None:
+            captured['last'] = (stats, response.status_code)
+        return response
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    results = {}
+    for label, url in urls.items():
+        # Requisição de aquecimento, fora da contagem: trabalho feito uma vez por dia ou por
+        # processo (recálculo preguiçoso das notificações, por exemplo) não entra no orçamento
+        client.get(url)
+        cache.clear()
+        captured.pop('last', None)
+        response = client.get(url)
+        stats, status = captured.get('last', (None, response.status_code))
+        if status != 200 or stats is None:
+            raise click.ClickException(f'{label} ({url}) respondeu {status}; a contagem não é confiável.')
+        results[label] = stats
+    return results
+
+
+def listing_specs():
+    """(endpoint, listagem, modelo, coluna de liquidado, data de liquidação) das listagens paginadas."""
+    from app.financeiro.models import Expense, RevenueTransaction
+    from app.financeiro.queries import expense_listing, revenue_listing
+    return (
+        ('financeiro.revenues', revenue_listing, RevenueTransaction, RevenueTransaction.is_received,
+         RevenueTransaction.receipt_date),
+        ('financeiro.expenses', expense_listing, Expense, Expense.is_paid, Expense.payment_date),
+    )
+
+
+def force_ties(user_id):
+    """Faz TIED_ROWS lançamentos liquidados do usuário dividirem a data de liquidação (3 deles
+    sem data) e TIED_ROWS pendentes dividirem o vencimento, em cada listagem."""
+    for _, _, model, settled, settled_date in listing_specs():
+        for is_settled, column, value in ((True, settled_date, datetime(2025, 3, 1)), (False, model.due_date, date(2026, 2, 1))):
+            ids = db.session.scalars(
+                db.select(model.id).where(model.user_id == user_id, settled == is_settled).order_by(model.id).limit(TIED_ROWS)
+            ).all()
+            db.session.execute(db.update(model).where(model.id.in_(ids)).values({column: value}))
+            if is_settled:
+                db.session.execute(db.update(model).where(model.id.in_(ids[:3])).values({column: None}))
+    db.session.commit()
+
+
+def walk_keyset(query_factory, model, column, per_page):
+    """Percorre a listagem pelos cursores next e depois volta pelos prev.
+
+    Retorna (cursores usados na ida, problemas): a ida deve trazer cada linha uma vez, na mesma
+    ordem de um ORDER BY simples (datas nulas no fim), e a volta deve repetir as mesmas páginas.
+    """
+    from app.financeiro.queries import keyset_paginate
+
+    expected = [row.id for row in query_factory().order_by(column.is_(None), column.desc(), model.id.desc())]
+    cursors, pages, cursor = [None], [], None
+    while True:
+        page = keyset_paginate(query_factory(), column, per_page, cursor=cursor)
+        pages.append([row.id for row in page.items])
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+        cursors.append(cursor)
+
+    problems = []
+    seen = [row_id for page_ids in pages for row_id in page_ids]
+    if len(seen) != len(set(seen)):
+        problems.append(f'{len(seen) - len(set(seen))} linha(s) repetida(s) entre páginas')
+    if set(seen) != set(expected):
+        problems.append(f'{len(set(expected) - set(seen))} linha(s) nunca exibida(s)')
+    elif seen != expected:
+        problems.append('ordem diferente do ORDER BY')
+
+    back, cursor = [pages[-1]], page.prev_cursor
+    while cursor:
+        page = keyset_paginate(query_factory(), column, per_page, cursor=cursor)
+        back.append([row.id for row in page.items])
+        cursor = page.prev_cursor if page.has_prev else None
+    if back[::-1] != pages:
+        problems.append('os cursores prev não reproduzem as páginas da ida')
+    return cursors, problems
+
+
+def walk_pending(query_factory, model, size):
+    """Percorre as janelas de pendentes pelos cursores after; retorna (cursores usados, problemas)."""
+    from app.financeiro.queries import pending_window
+
+    expected = [row.id for row in query_factory().order_by(model.due_date.asc(), model.id.asc())]
+    cursors, seen, cursor = [None], [], None
+    while True:
+        items, cursor = pending_window(query_factory(), model.due_date, size=size, cursor=cursor)
+        seen += [row.id for row in items]
+        if cursor is None:
+            break
+        cursors.append(cursor)
+
+    problems = []
+    if len(seen) != len(set(seen)):
+        problems.append(f'{len(seen) - len(set(seen))} linha(s) repetida(s) entre janelas')
+    if seen != expected:
+        problems.append('janelas não cobrem as pendentes na ordem (vencimento, id)')
+    return cursors, problems
+
+
+def pagination_urls(app, user_id):
+    """Força empates de data, confere os cursores das listagens e retorna ({(endpoint, n): url
+    de cada página/janela}, {endpoint: problemas}) para a contagem de statements por página."""
+    from app.financeiro.queries import PENDING_WINDOW
+
+    urls, problems = {}, {}
+    with app.test_request_context():
+        force_ties(user_id)
+        for endpoint, listing, model, settled, settled_date in listing_specs():
+            settled_rows = lambda: listing(user_id).filter(settled == True)
+            pending_rows = lambda: listing(user_id).filter(settled == False)
+            cursors, problems[endpoint] = walk_keyset(settled_rows, model, settled_date, LISTING_PER_PAGE)
+            # Janelas pequenas na conferência dos cursores, para os empates cruzarem várias delas
+            problems[f'{endpoint}_pending'] = walk_pending(pending_rows, model, 7)[1]
+            windows, _ = walk_pending(pending_rows, model, PENDING_WINDOW)
+            for n, cursor in enumerate(cursors):
+                urls[(endpoint, n)] = url_for(endpoint, cursor=cursor)
+            for n, cursor in enumerate(windows):
+                urls[(f'{endpoint}_pending', n)] = url_for(f'{endpoint}_pending', after=cursor)
+        db.session.remove()
+    return urls, problems
+
+
+def page_results(stats, problems):
+    """{endpoint: (páginas, maior contagem, problemas)} a partir das contagens das urls de pagination_urls."""
+    results = {}
+    for endpoint, budget in PAGE_BUDGETS.items():
+        counts = [queries.count for key, queries in stats.items() if isinstance(key, tuple) and key[0] == endpoint]
+        if max(counts) > budget:
+            problems[endpoint].append(f'página com {max(counts)} statements > {budget}')
+        results[endpoint] = (len(counts), max(counts), problems[endpoint])
+    return results
+
+
+def call_targets():
+    """{nome em CALL_BUDGETS: função(user_id)}."""
+    from app.financeiro.models import Wallet
+    from app.main.routes import get_dashboard_payload
+    return {
+        'Wallet.balances_for_user': Wallet.balances_for_user,
+        'main.get_dashboard_payload': get_dashboard_payload,
+    }
+
+
+def count_call_queries(app, user_id, names):
+    """Chama cada função de CALL_BUDGETS para user_id e retorna {nome: RequestQueries da chamada}."""
+    targets = call_targets()
+    results = {}
+    with app.test_request_context():
+        for name in names:
+            g.query_stats = RequestQueries()
+            targets[name](user_id)
+            results[name] = g.query_stats
+            db.session.expire_all()
+    return results
+
+
+@click.command('query-budget')
+@click.option('--only', default='', help='Confere só estes endpoints/funções (separados por vírgula).')
+@click.option('--verbose', '-v', is_flag=True, help='Lista os formatos de consulta de cada rota.')
+@with_appcontext
+def query_budget_command(only, verbose):
+    """Confere a quantidade de statements SQL de cada rota e leitura agregada em dois volumes de dados.
+
+    Falha (código 1) se a contagem de uma rota cresce com o volume de dados (consulta por
+    linha, N+1) ou passa do orçamento declarado em ROUTE_BUDGETS / CALL_BUDGETS. Sem --only,
+    também percorre as listagens paginadas com datas empatadas: cada linha deve aparecer uma
+    vez pelos cursores next, os prev devem refazer as mesmas páginas e nenhuma página ou
+    janela pode passar de PAGE_BUDGETS.
+    """
+    from .benchmarks import build_dataset, dataset_app, reset_work_copy
+    from app.auth.models import User
+    from app.financeiro.tasks import refresh_due_today_counts
+
+    budgets = {**ROUTE_BUDGETS, **CALL_BUDGETS}
+    selected = [e.strip() for e in only.split(',') if e.strip()] or list(budgets)
+    unknown = [e for e in selected if e not in budgets]
+    if unknown:
+        raise click.BadParameter(f'sem orçamento declarado: {", ".join(unknown)}', param_hint='--only')
+
+    directory = os.path.join(current_app.config['BENCHMARK_DIR'], 'data')
+    counts, pagination = {}, {}
+    for name, spec in BUDGET_DATASETS.items():
+        path = build_dataset(f'budget-{name}', directory, spec)
+        app = dataset_app(path, QUERY_STATS_ENABLED=True, QUERY_STATS_PANEL=False, PROFILER_ENABLED=False)
+        with app.app_context():
+            reset_work_copy(path)
+            # As contagens de notificação gravadas no seed são do dia em que o banco foi gerado;
+            # sem isso a primeira requisição de outro dia faz o recálculo e a contagem muda com a data
+            refresh_due_today_counts(date.today())
+            user = db.session.scalar(db.select(User).order_by(User.id).limit(1))
+            user.is_admin = True
+            db.session.commit()
+            user_id = user.id
+            db.session.remove()
+
+        with app.test_request_context():
+            urls = {endpoint: url_for(endpoint) for endpoint in selected if endpoint in ROUTE_BUDGETS}
+        page_problems = {}
+        if not only:
+            page_urls, page_problems = pagination_urls(app, user_id)
+            urls.update(page_urls)
+
+        # Fora do app_context: cada requisição precisa do seu próprio contexto (g e sessão novos)
+        counts[name] = count_url_queries(app, user_id, urls)
+        counts[name].update(count_call_queries(app, user_id, [e for e in selected if e in CALL_BUDGETS]))
+        if not only:
+            pagination[name] = page_results(counts[name], page_problems)
+        with app.app_context():
+            db.engine.dispose()
+
+    failures = 0
+    small, large = BUDGET_DATASETS
+    click.echo(f"{'endpoint':<32} {small:>7} {large:>7} {'budget':>7}")
+    for endpoint in selected:
+        few, many = counts[small][endpoint], counts[large][endpoint]
+        budget = budgets[endpoint]
+        problems = []
+        if many.count > few.count:
+            problems.append(f'cresce com os dados ({few.count} -> {many.count})')
+        if max(few.count, many.count) > budget:
+            problems.append(f'acima do orçamento ({max(few.count, many.count)} > {budget})')
+        status = '; '.join(problems) or 'ok'
+        click.echo(f'{endpoint:<32} {few.count:>7} {many.count:>7} {budget:>7}  {status}')
+
+        if problems or verbose:
+            threshold = current_app.config.get('QUERY_STATS_NPLUSONE_THRESHOLD', 5)
+            for shape, count, _ in many.repeated(threshold):
+                click.echo(f'    {count}x {shape[:160]}')
+            if verbose:
+                for shape, (count, _, _) in many.shapes.items():
+                    click.echo(f'    [{count}] {shape[:160]}')
+        failures += bool(problems)
+
+    if pagination:
+        click.echo(f"\n{'paginação':<40} {'páginas':>7} {'máx/pg':>7} {'budget':>7}")
+    for name, results in pagination.items():
+        for endpoint, (pages, most, problems) in results.items():
+            status = '; '.join(problems) or 'ok'
+            click.echo(f'{endpoint + " (" + name + ")":<40} {pages:>7} {most:>7} {PAGE_BUDGETS[endpoint]:>7}  {status}')
+            failures += bool(problems)
+
+    if failures:
+        click.echo(f'{failures} rota(s)/função(ões) fora do orçamento de consultas.')
+        raise SystemExit(1)
+    click.echo('Todas as rotas e funções dentro do orçamento de consultas.')
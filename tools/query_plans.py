@@ -0,0 +1,149 @@
+import os
+import re
+
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from app.extensions import db, cache
+from app.query_stats import statement_shape
+from app.slow_queries import explain_query_plan
+
+# Índices compostos por usuário: toda leitura quente nessas tabelas deve usar um deles
+HOT_INDEXES = {
+    'expense': ('ix_expense_user_paid_due', 'ix_expense_user_paid_payment'),
+    'revenue_transaction': ('ix_revenue_user_received_due', 'ix_revenue_user_received_receipt'),
+}
+
+# Rotas cujas leituras são conferidas; as listagens também são abertas numa página seguinte
+# (cursor), para cobrir os predicados de seek
+HOT_ROUTES = (
+    'main.index',
+    'financeiro.revenues',
+    'financeiro.revenues_pending',
+    'financeiro.expenses',
+    'financeiro.expenses_pending',
+    'financeiro.wallets',
+)
+
+_TABLES = re.compile(r'\b(expense|revenue_transaction)\b')
+_STEP = re.compile(r'^\s*(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def plan_problems(plan):
+    """Problemas de um plano do EXPLAIN QUERY PLAN nas tabelas de HOT_INDEXES (lista vazia se ok)."""
+    problems = []
+    for line in plan.splitlines():
+        if 'TEMP B-TREE FOR ORDER BY' in line:
+            problems.append('ordenação em B-tree temporária')
+        match = _STEP.match(line)
+        if not match or match.group(2) not in HOT_INDEXES:
+            continue
+        operation, table, index = match.groups()
+        if operation == 'SCAN':
+            problems.append(f'SCAN em {table}')
+        elif index not in HOT_INDEXES[table]:
+            problems.append(f'{table} sem índice por usuário ({line.strip()})')
+    return problems
+
+
+def hot_urls(app, user_id):
+    """{rótulo: url} das rotas de HOT_ROUTES, mais a segunda página de cada listagem."""
+    from app.financeiro.queries import keyset_paginate, pending_window
+    from .query_budget import listing_specs
+
+    with app.test_request_context():
+        urls = {endpoint: url_for(endpoint) for endpoint in HOT_ROUTES}
+        for endpoint, listing, model, settled, settled_date in listing_specs():
+            page = keyset_paginate(listing(user_id).filter(settled == True), settled_date, 10)
+            if page.next_cursor:
+                urls[f'{endpoint} (página 2)'] = url_for(endpoint, cursor=page.next_cursor)
+            _, cursor = pending_window(listing(user_id).filter(settled == False), model.due_date)
+            if cursor:
+                urls[f'{endpoint}_pending (janela 2)'] = url_for(f'{endpoint}_pending', after=cursor)
+        db.session.remove()
+    return urls
+
+
+def capture_statements(app, user_id, urls):
+    """Executa as urls como user_id e retorna {formato: (statement, parâmetros, rótulo)} dos SELECTs nas tabelas quentes."""
+    captured = {}
+    origin = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return
+        if _TABLES.search(statement):
+            captured.setdefault(statement_shape(statement), (statement, parameters, origin.get('label')))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for label, url in urls.items():
+            origin['label'] = label
+            cache.clear()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise click.ClickException(f'{label} ({url}) respondeu {response.status_code}.')
+        origin['label'] = 'refresh_due_today_counts'
+        with app.app_context():
+            from app.financeiro.tasks import refresh_due_today_counts
+            refresh_due_today_counts(user_id=user_id)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return captured
+
+
+@click.command('query-plans')
+@click.option('--verbose', '-v', is_flag=True, help='Mostra o plano de todos os statements, não só os com problema.')
+@with_appcontext
+def query_plans_command(verbose):
+    """Confere com EXPLAIN QUERY PLAN que as leituras quentes usam os índices por usuário.
+
+    Abre as rotas de HOT_ROUTES (e a página seguinte das listagens) no volume maior do
+    `flask query-budget` e falha (código 1) se algum SELECT em expense/revenue_transaction
+    fizer SCAN na tabela, usar um índice fora de HOT_INDEXES ou ordenar em B-tree temporária.
+    Só SQLite.
+    """
+    from .benchmarks import build_dataset, dataset_app, reset_work_copy
+    from .query_budget import BUDGET_DATASETS
+    from app.auth.models import User
+
+    directory = os.path.join(current_app.config['BENCHMARK_DIR'], 'data')
+    path = build_dataset('budget-large', directory, BUDGET_DATASETS['large'])
+    app = dataset_app(path, QUERY_STATS_ENABLED=False, PROFILER_ENABLED=False, SLOW_QUERY_ENABLED=False)
+    with app.app_context():
+        reset_work_copy(path)
+        user_id = db.session.scalar(db.select(User.id).order_by(User.id).limit(1))
+        db.session.remove()
+
+    captured = capture_statements(app, user_id, hot_urls(app, user_id))
+
+    failures = 0
+    used = set()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for shape, (statement, parameters, label) in captured.items():
+                plan = explain_query_plan(conn, statement, parameters)
+                if plan is None:
+                    raise click.ClickException('EXPLAIN QUERY PLAN indisponível (o banco precisa ser SQLite).')
+                used.update(index for indexes in HOT_INDEXES.values() for index in indexes if index in plan)
+                problems = plan_problems(plan)
+                failures += bool(problems)
+                if problems or verbose:
+                    click.echo(f"[{label}] {'; '.join(problems) or 'ok'}\n    {shape[:200]}")
+                    click.echo('\n'.join(f'      {line}' for line in plan.splitlines()))
+        db.engine.dispose()
+
+    click.echo(f"{len(captured)} statements conferidos; índices usados: {', '.join(sorted(used)) or 'nenhum'}.")
+    if failures:
+        click.echo(f'{failures} statement(s) sem índice por usuário.')
+        raise SystemExit(1)
+    click.echo('Todas as leituras quentes usam os índices por usuário.')